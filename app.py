@@ -1,9 +1,7 @@
 import streamlit as st
-import time
-import app_estudio
-import app_habitos
-import app_biblioteca
-import app_noticias
+import perfilado
+import paginas
+from estudio_usuarios import usuarios_configurados, usuario_por_defecto, siguiente_usuario
 
 # 1. Configuración global  
 st.set_page_config(
@@ -23,10 +21,9 @@ if "usuario_seleccionado" not in st.session_state:
     st.session_state.usuario_seleccionado = None
 if "auto_login_done" not in st.session_state:
     st.session_state.auto_login_done = False
-if "switching_user" not in st.session_state:
-    st.session_state.switching_user = False
 
 query_params = st.query_params
+USUARIOS = usuarios_configurados()
 
 # Si tiene el parámetro password, autenticamos globalmente
 if "password" in query_params:
@@ -35,63 +32,42 @@ if "password" in query_params:
 # -------------------------------------------------------
 # LÓGICA DE SELECCIÓN DE USUARIO (SIN LOCKS)
 # -------------------------------------------------------
+AVISO_DOS_DISPOSITIVOS = "⚠️ **Atención:** Nunca usar la aplicación en dos dispositivos a la vez."
+
 def handle_user_login(selected_user):
+    # El snapshot compartido ya trae a todos los usuarios: no hace falta releer la hoja
     st.session_state.usuario_seleccionado = selected_user
-    st.session_state.clear_cache_estudio = True # Limpiar caché al seleccionar usuario
     st.rerun()
 
+def cambiar_usuario_callback():
+    # Corre antes del rerun que dispara el botón: el cambio se ve en ese mismo rerun,
+    # sin pausas ni lecturas. Materia en curso e inicio quedan guardados por usuario.
+    # Ver a otro usuario no toma su lease: si lo tiene otro dispositivo la página queda
+    # de solo lectura, y si está libre se toma recién con el primer botón que escribe.
+    st.session_state.usuario_seleccionado = siguiente_usuario(USUARIOS, st.session_state.usuario_seleccionado)
+    st.session_state.current_page = "estudio"
+    st.session_state.aviso_cambio_usuario = True
+    if len(st.query_params) > 0:
+        st.query_params.clear()
+
 # Auto-ingreso automático (Solo ocurre en la primera carga)
 if not st.session_state.auto_login_done and st.session_state.usuario_seleccionado is None:
     st.session_state.auto_login_done = True # Marcamos para que no vuelva a forzar el ingreso si cierran sesión
-    if "password" in query_params:
-        handle_user_login("Facundo")
-    else:
-        # Cualquier otra URL (sin parámetros o con cualquier cosa que no sea password) va a Iván
-        handle_user_login("Iván")
+    # Con password entra el primer admin de la config; cualquier otra URL, el primer usuario común
+    handle_user_login(usuario_por_defecto(USUARIOS, admin="password" in query_params))
 
 USUARIO_ACTUAL = st.session_state.get("usuario_seleccionado")
 
 # ---------------------------------------------------------
-# PANTALLA DE CARGA (TRANSICIÓN)
-# ---------------------------------------------------------
-if st.session_state.get("switching_user", False):
-    st.title("⏳ Cambiando de usuario...")
-    st.markdown("---")
-    st.warning("**Atención:** Nunca usar la aplicación en dos dispositivos a la vez.", icon="⚠️")
-    
-    # Pausa de 1.5 segundos para que se alcance a leer el cartel
-    time.sleep(1.5) 
-    
-    # Lógica para alternar el usuario directamente
-    nuevo_usuario = "Iván" if USUARIO_ACTUAL == "Facundo" else "Facundo"
-    st.session_state.usuario_seleccionado = nuevo_usuario
-    st.session_state.switching_user = False
-    st.session_state.clear_cache_estudio = True # Limpiar caché al cambiar usuario
-    st.rerun()
-
-# ---------------------------------------------------------
-# BOTÓN EN LA BARRA LATERAL (DISPARADOR)
+# BOTÓN EN LA BARRA LATERAL (CAMBIO INSTANTÁNEO)
 # ---------------------------------------------------------
 # Botón para salir/cambiar de usuario
 if USUARIO_ACTUAL is not None:
-    if st.sidebar.button("🚪 Cambiar Usuario", use_container_width=True):
-        # 1. Mostramos el mensaje directamente en la barra lateral
-        st.sidebar.warning("⚠️ **Atención:** Nunca usar la aplicación en dos dispositivos a la vez.", icon="🚫")
-        
-        # 2. Hacemos la pausa de 1 segundo para que se lea
-        time.sleep(1)
-        
-        # 3. Alternamos el usuario directamente
-        nuevo_usuario = "Iván" if USUARIO_ACTUAL == "Facundo" else "Facundo"
-        st.session_state.usuario_seleccionado = nuevo_usuario
-        st.session_state.current_page = "estudio"
-        st.session_state.clear_cache_estudio = True # Limpiar caché al volver a estudio
-        
-        if len(st.query_params) > 0:
-            st.query_params.clear()
-            
-        # 4. Recargamos la aplicación
-        st.rerun()
+    st.sidebar.button("🚪 Cambiar Usuario", use_container_width=True, on_click=cambiar_usuario_callback)
+
+# El aviso va como toast: se lee sin frenar el script
+if st.session_state.pop("aviso_cambio_usuario", False):
+    st.toast(f"{AVISO_DOS_DISPOSITIVOS} Ahora: **{USUARIO_ACTUAL}**", icon="🚫")
 
 # ---------------------------------------------------------
 # SELECCIÓN DE USUARIO (INTERFAZ)
@@ -99,19 +75,16 @@ if USUARIO_ACTUAL is not None:
 if st.session_state.usuario_seleccionado is None:
     st.title("Selección de Usuario")
     
-    col1, col2 = st.columns(2)
+    cols = st.columns(min(len(USUARIOS), 4))
     
-    with col1:
-        if st.button("👤 Facundo", key="btn_facundo", use_container_width=True):
-            handle_user_login("Facundo")
-
-    with col2:
-        if st.button("👤 Iván", key="btn_ivan", use_container_width=True):
-            handle_user_login("Iván")
+    for i, nombre in enumerate(USUARIOS):
+        with cols[i % len(cols)]:
+            if st.button(f"👤 {nombre}", key=f"btn_usuario_{i}", use_container_width=True):
+                handle_user_login(nombre)
 
     # --- El cartel de advertencia ---
     st.markdown("---") # Una línea divisoria para separar
-    st.warning("⚠️ **Atención:** Nunca usar la aplicación en dos dispositivos a la vez.", icon="🚫")
+    st.warning(AVISO_DOS_DISPOSITIVOS, icon="🚫")
 
     st.stop() 
 
@@ -120,7 +93,8 @@ if st.session_state.usuario_seleccionado is None:
 # ---------------------------------------------------------
 
 # Variable estricta para permisos de administrador:
-is_admin = (st.session_state.usuario_seleccionado == "Facundo") and st.session_state.authenticated
+usuario_admin = st.session_state.usuario_seleccionado in USUARIOS and USUARIOS[st.session_state.usuario_seleccionado].admin
+is_admin = usuario_admin and st.session_state.authenticated
 
 # --- Botón para ir a ESTUDIO ---
 if st.session_state.current_page != "estudio":
@@ -135,14 +109,19 @@ if is_admin and st.session_state.current_page != "habitos":
         st.session_state.current_page = "habitos"
         st.rerun()
 
+# --- Panel de perfilado (solo admin) ---
+if is_admin:
+    perfilado.panel_admin()
+
 # --------------------------------------------------------
 # ROUTER (Decide qué app mostrar)
+# Cada página se importa recién la primera vez que se la visita (paginas.py)
 # --------------------------------------------------------
 
 if st.session_state.current_page == "habitos":
     if not is_admin:
-        if st.session_state.usuario_seleccionado != "Facundo":
-            st.error("Solo Facundo tiene permisos para acceder a esta sección.")
+        if not usuario_admin:
+            st.error("Solo un administrador tiene permisos para acceder a esta sección.")
             st.stop()
         else:
             password_input = st.text_input("Contraseña:", type="password")
@@ -153,12 +132,13 @@ if st.session_state.current_page == "habitos":
                 else:
                     st.error("Contraseña incorrecta.")
             st.stop()
-    app_habitos.run()
+    with perfilado.pagina("habitos"):
+        paginas.cargar("habitos")()
 
 elif st.session_state.current_page == "biblioteca":
     if not is_admin:
-        if st.session_state.usuario_seleccionado != "Facundo":
-            st.error("Solo Facundo tiene permisos para acceder a esta sección.")
+        if not usuario_admin:
+            st.error("Solo un administrador tiene permisos para acceder a esta sección.")
             st.stop()
         else:
             password_input = st.text_input("Contraseña:", type="password")
@@ -169,12 +149,13 @@ elif st.session_state.current_page == "biblioteca":
                 else:
                     st.error("Contraseña incorrecta.")
             st.stop()
-    app_biblioteca.main()
+    with perfilado.pagina("biblioteca"):
+        paginas.cargar("biblioteca")()
 
 elif st.session_state.current_page == "noticias":
     if not is_admin:
-        if st.session_state.usuario_seleccionado != "Facundo":
-            st.error("Solo Facundo tiene permisos para acceder a esta sección.")
+        if not usuario_admin:
+            st.error("Solo un administrador tiene permisos para acceder a esta sección.")
             st.stop()
         else:
             password_input = st.text_input("Contraseña:", type="password")
@@ -185,7 +166,9 @@ elif st.session_state.current_page == "noticias":
                 else:
                     st.error("Contraseña incorrecta.")
             st.stop()
-    app_noticias.main()
+    with perfilado.pagina("noticias"):
+        paginas.cargar("noticias")()
 
 else:
-    app_estudio.main()
+    with perfilado.pagina("estudio"):
+        paginas.cargar("estudio")()
@@ -1,11 +1,27 @@
+import os
 import re
 import json
 import time
-from datetime import datetime, date, timedelta, time as dt_time
+import functools
+import uuid
+import threading
+from datetime import datetime, date, timedelta
+import numpy as np
 import streamlit as st
-from google.oauth2 import service_account
-from google.auth.transport.requests import AuthorizedSession
+import streamlit.components.v1 as components
 from requests.exceptions import RequestException
+from estudio_journal import Journal
+from estudio_sondeo import Sondeador, INTERVALO as INTERVALO_SONDEO
+import perfilado
+from google_sesion import get_sheets_client
+from sheet_layout import DayLayout, MateriaLayout, format_a1, agrupar_celdas, desagrupar
+from estudio_usuarios import usuarios_configurados
+from estudio_sesiones import (RegistroSesiones, SHEET_SESIONES, RANGO_APPEND, filas_sesion, fila_ajuste, fila_legado,
+                              clave_dia)
+from estudio_historial import rangos_historial, decodificar_historial, ventana
+from estudio_metricas import apilar, calcular_metricas
+from sheets_decode import (UNFORMATTED, SERIAL_NUMBER, segundos, epoch, texto, datetime_de_epoch,
+                           columna_segundos, columna_numeros, columna_epoch)
 
 # ------------------ TIMEZONE HELPERS ------------------
 try:
@@ -57,6 +73,69 @@ def cargar_estilos():
         </style>
     """, unsafe_allow_html=True)
 
+# ------------------ RELOJ EN EL NAVEGADOR ------------------
+# Mientras se estudia, la tarjeta "Hoy" y la de la materia activa se dibujan en
+# un componente que avanza solo cada segundo: ver el tiempo correr no genera
+# reruns ni llamadas a Sheets. Cada tick es valor_al_renderizar + tasa * segundos.
+
+_CSS_VIVO = """
+<style>
+body { margin: 0; font-family: "Source Sans Pro", sans-serif; font-size: 18px; color: #fafafa; background: transparent; }
+.materia-card { background-color: #262730; border: 1px solid #464b5c; padding: 20px; border-radius: 15px; box-shadow: 0 4px 6px rgba(0,0,0,0.3); }
+.materia-title { font-size: 1.4rem; font-weight: bold; color: #ffffff; margin-bottom: 5px; }
+.materia-time { font-size: 1.6rem; font-weight: bold; color: #00e676; font-family: 'Courier New', monospace; margin-bottom: 15px; }
+.status-badge { display: inline-block; padding: 5px 10px; border-radius: 12px; font-size: 0.9rem; font-weight: bold; margin-bottom: 10px; }
+.status-active { background-color: rgba(0, 230, 118, 0.2); color: #00e676; border: 1px solid #00e676; }
+</style>
+"""
+
+_JS_VIVO = """
+<script>
+const TICKS = %s;
+const t0 = performance.now();
+const pad = n => String(n).padStart(2, "0");
+const hms = s => { s = Math.max(0, Math.floor(s)); return pad(Math.floor(s / 3600)) + ":" + pad(Math.floor(s %% 3600 / 60)) + ":" + pad(s %% 60); };
+const dinero = v => (v < 0 ? "-$" : "$") + Math.abs(v).toFixed(2);
+function tick() {
+  const dt = (performance.now() - t0) / 1000;
+  for (const t of TICKS) {
+    const el = document.getElementById(t.id);
+    if (!el) continue;
+    let v = t.v0 + t.tasa * dt;
+    if (t.min !== undefined) v = Math.max(t.min, v);
+    if (t.max !== undefined) v = Math.min(t.max, v);
+    if (t.tipo === "hms") el.textContent = hms(v);
+    else if (t.tipo === "dinero") el.textContent = dinero(v);
+    else if (t.tipo === "horas") el.textContent = v.toFixed(2) + "hs";
+    else if (t.tipo === "balance") {
+      el.textContent = Math.abs(v) < 0.005 ? "$0.00" : dinero(v);
+      el.style.color = v > 0 ? "#00e676" : v < 0 ? "#ff1744" : "#aaa";
+    } else if (t.tipo === "barra") {
+      el.style.width = v + "%%";
+      el.style.backgroundColor = v >= 90 ? "#00e676" : v >= 50 ? "#ffeb3b" : "#ff1744";
+    }
+  }
+}
+setInterval(tick, 1000);
+</script>
+"""
+
+def tick(id, tipo, v0, tasa, min=None, max=None):
+    t = {"id": id, "tipo": tipo, "v0": v0, "tasa": tasa}
+    if min is not None: t["min"] = min
+    if max is not None: t["max"] = max
+    return t
+
+def html_vivo(cuerpo, ticks, height):
+    """Dibuja `cuerpo` en un iframe que actualiza los elementos de `ticks` en el navegador."""
+    iframe_html(_CSS_VIVO + cuerpo + _JS_VIVO % json.dumps(ticks), height)
+
+def iframe_html(html, height):
+    if hasattr(st, "iframe"):
+        st.iframe(html, height=height)
+    else:
+        components.html(html, height=height)
+
 def _argentina_now_global():
     if ZoneInfo is not None:
         return datetime.now(ZoneInfo('America/Argentina/Cordoba'))
@@ -109,30 +188,6 @@ def segundos_a_hms(seg):
     return f"{h:02d}:{m:02d}:{s:02d}"
 
 def hms_a_minutos(hms): return hms_a_segundos(hms) / 60
-def parse_float_or_zero(s):
-    if s is None: return 0.0
-    try: return float(str(s).replace(",", ".").strip())
-    except: return 0.0
-
-def parse_time_cell_to_seconds(val):
-    if val is None: return 0
-    s = str(val).strip()
-    if s == "": return 0
-    if ":" in s:
-        try: return hms_a_segundos(s)
-        except: return 0
-    try:
-        f = float(s.replace(",", "."))
-        if 0 <= f <= 1:
-            return int(f * 86400)
-        return int(f)
-    except:
-        return 0
-
-def replace_row_in_range(range_str, new_row):
-    if not isinstance(range_str, str): return range_str
-    return re.sub(r'(\d+)(\s*$)', str(new_row), range_str)
-
 def sanitize_key(s):
     return re.sub(r'[^a-zA-Z0-9_]', '_', s)
 
@@ -141,36 +196,18 @@ def pedir_rerun():
     st.session_state["_do_rerun"] = True
 
 # ------------------ GOOGLE SHEETS SESSION ------------------
-@st.cache_resource
+# Credenciales, token y pool son los de google_sesion.py, compartidos con Hábitos
 def get_sheets_session():
     try:
-        key_dict = json.loads(st.secrets["service_account"])
-    except Exception as e:
-        st.error(f"Error leyendo st.secrets['service_account']")
-        st.stop()
-    try:
-        creds = service_account.Credentials.from_service_account_info(
-            key_dict,
-            scopes=["https://www.googleapis.com/auth/spreadsheets"]
-        )
-        return AuthorizedSession(creds)
+        return get_sheets_client()
     except Exception as e:
         st.error(f"Error creando credenciales")
         st.stop()
 
-session = get_sheets_session()
-
-def sheets_batch_get(spreadsheet_id, ranges):
-    url = f"https://sheets.googleapis.com/v4/spreadsheets/{spreadsheet_id}/values:batchGet"
+def sheets_batch_get(spreadsheet_id, ranges, value_render_option=UNFORMATTED):
     unique_ranges = list(dict.fromkeys(ranges))
-    params = []
-    for r in unique_ranges:
-        params.append(("ranges", r))
-    params.append(("valueRenderOption", "FORMATTED_VALUE"))
     try:
-        resp = session.get(url, params=params, timeout=30)
-        resp.raise_for_status()
-        data = resp.json()
+        data = get_sheets_session().batch_get(spreadsheet_id, unique_ranges, value_render_option, SERIAL_NUMBER)
         ordered_results = data.get("valueRanges", [])
         result_map = {r: res for r, res in zip(unique_ranges, ordered_results)}
         final_list = []
@@ -184,169 +221,368 @@ def sheets_batch_get(spreadsheet_id, ranges):
         raise RuntimeError(f"Error HTTP en batchGet al leer la hoja: {e}")
 
 def sheets_batch_update(spreadsheet_id, updates):
-    url = f"https://sheets.googleapis.com/v4/spreadsheets/{spreadsheet_id}/values:batchUpdate"
-    data = {
-        "valueInputOption": "USER_ENTERED",
-        "data": [{"range": r, "values": [[v]]} for r, v in updates]
-    }
+    # Toda escritura de la app cambia la celda de revisión en el mismo pedido
+    updates = list(updates) + [(RANGO_REVISION, nueva_revision())]
     try:
-        resp = session.post(url, json=data, timeout=30)
-        resp.raise_for_status()
-        return resp.json()
+        return get_sheets_session().batch_update(spreadsheet_id, [{"range": r, "values": [[v]]} for r, v in updates])
     except RequestException as e:
         raise RuntimeError(f"Error HTTP en batchUpdate al escribir en la hoja: {e}")
 
+def sheets_append(spreadsheet_id, rango, filas):
+    try:
+        return get_sheets_session().append(spreadsheet_id, rango, filas)
+    except RequestException as e:
+        raise RuntimeError(f"Error HTTP en append al agregar filas a la hoja: {e}")
+
 # ------------------ CONSTANTES ESTRUCTURALES (FIJAS) ------------------
+# Los usuarios (hojas, materias, columnas de marcas, locks) vienen de la config:
+# ver estudio_usuarios.py. Acá queda solo lo compartido.
 FILA_BASE = 5
-FILA_BASE2 = 10
 FECHA_BASE = date(2026, 1, 1)
-SHEET_FACUNDO = "F. Economía"
-SHEET_IVAN = "I. Física"
 SHEET_MARCAS = "marcas"
 
 RANGO_FECHA_MAIL = f"'{SHEET_MARCAS}'!Z1"
-RANGO_LOCK_IVAN = f"'{SHEET_MARCAS}'!Z2"
-RANGO_LOCK_FACUNDO = f"'{SHEET_MARCAS}'!Z3"
 RANGO_FECHA_MAIL_VAGO = f"'{SHEET_MARCAS}'!Z12" 
+COL_WEEK = "R"
+
+# ------------------ REVISIÓN DE LA HOJA (TIPO ETAG) ------------------
+# Cada batchUpdate de la app escribe un valor nuevo en esta celda. El sondeador
+# primero lee solo esta celda y hace la lectura completa únicamente si cambió
+# desde la última. Lo que no pasa por la app (ediciones a mano, fórmulas que
+# dependen de la fecha) lo levanta la lectura completa forzada cada
+# REVISION_COMPLETA_SEGUNDOS o al cambiar el día.
+RANGO_REVISION = f"'{SHEET_MARCAS}'!Z20"
+REVISION_COMPLETA_SEGUNDOS = 300
+
+def nueva_revision():
+    # Se compara por igualdad: alcanza con que sea distinta a todas las anteriores, sin leer
+    # la celda para sumarle uno (dos dispositivos podrían escribir el mismo número). La letra
+    # de adelante evita que Sheets la interprete como número o fecha.
+    return f"r{time.time_ns():x}-{uuid.uuid4().hex[:6]}"
 
 # ------------------ CONFIGURACIÓN DINÁMICA DEL DÍA ------------------
-# Esta función reemplaza las constantes globales que causaban el bug.
-# Calcula los rangos basándose en el momento en que se llama.
-
-def get_day_config(target_date=None):
+# Las filas avanzan un día por fila desde FECHA_BASE; 'marcas' va dos filas arriba.
+def get_day_config(target_date=None, usuarios=None):
+    """Layout inmutable del día (hoy por defecto), memoizado por fecha y config de usuarios."""
     if target_date is None:
         target_date = _argentina_now_global().date()
-    
+    return _build_day_layout(usuarios or usuarios_configurados(), target_date)
+
+@functools.lru_cache(maxsize=64)
+def _build_day_layout(usuarios, target_date):
     delta = (target_date - FECHA_BASE).days
     time_row = FILA_BASE + delta
-    time_row2 = FILA_BASE2 + delta
-    
-    # Construimos los rangos dinámicamente usando time_row actual
-    users_dict = {
-        "Facundo": {
-            "Trabajo":         {"time": f"'{SHEET_FACUNDO}'!B{time_row2}", "est": f"'{SHEET_MARCAS}'!Z10", "excluir": True},
-            "Cursado":         {"time": f"'{SHEET_FACUNDO}'!C{time_row2}", "est": f"'{SHEET_MARCAS}'!Z14"},
-            "Estadística I":    {"time": f"'{SHEET_FACUNDO}'!D{time_row2}", "est": f"'{SHEET_MARCAS}'!Z4"},
-            "Int. Contabilidad":    {"time": f"'{SHEET_FACUNDO}'!E{time_row2}", "est": f"'{SHEET_MARCAS}'!Z5"},
-            "Sociología": {"time": f"'{SHEET_FACUNDO}'!F{time_row2}", "est": f"'{SHEET_MARCAS}'!Z6"},
-            "Derecho Público":        {"time": f"'{SHEET_FACUNDO}'!G{time_row2}", "est": f"'{SHEET_MARCAS}'!Z7"},
-        },
-        "Iván": {
-            "Física":   {"time": f"'{SHEET_IVAN}'!B{time_row}", "est": f"'{SHEET_MARCAS}'!Z8"},
-            "Análisis": {"time": f"'{SHEET_IVAN}'!C{time_row}", "est": f"'{SHEET_MARCAS}'!Z9"},
-            "Álgebra": {"time": f"'{SHEET_IVAN}'!D{time_row}", "est": f"'{SHEET_MARCAS}'!Z13"},
+    marcas_row = time_row - 2
+
+    users = {
+        u.nombre: {
+            nombre: MateriaLayout(
+                nombre,
+                format_a1(u.hoja, col, u.fila_base + delta),
+                f"'{SHEET_MARCAS}'!{est}",
+                excluir,
+            )
+            for nombre, col, est, excluir in u.materias
         }
-    }
-    
-    return {
-        "TIME_ROW": time_row,
-        "USERS": users_dict,
-        "WEEK_RANGE": f"'{SHEET_MARCAS}'!R{time_row-2}",
-        "RANGO_RATE_FACU": f"'{SHEET_MARCAS}'!C{time_row-2}",
-        "RANGO_RATE_IVAN": f"'{SHEET_MARCAS}'!B{time_row-2}",
-        "RANGO_OBJ_FACU": f"'{SHEET_MARCAS}'!P{time_row-2}",
-        "RANGO_OBJ_IVAN": f"'{SHEET_MARCAS}'!O{time_row-2}",
-        "RANGO_CHECK_IVAN": f"'{SHEET_MARCAS}'!H{time_row-2}",
-        "RANGO_CHECK_FACU": f"'{SHEET_MARCAS}'!I{time_row-2}",
-        "RANGO_POZO_IVAN": f"'{SHEET_MARCAS}'!W{time_row-2}",
-        "RANGO_POZO_FACU": f"'{SHEET_MARCAS}'!X{time_row-2}",
+        for u in usuarios.values()
     }
 
-# ------------------ CARGA UNIFICADA (cacheada por fecha) ------------------
-# Agregamos fecha_str como argumento para que el cache se invalide al cambiar el día
-@st.cache_data()
-def cargar_datos_unificados(fecha_str):
-    # Obtenemos la config para el día actual
-    cfg = get_day_config() # Usa la fecha actual por defecto (que coincide con fecha_str)
-    USERS_LOCAL = cfg["USERS"]
-    
-    yesterday = _argentina_now_global().date() - timedelta(days=1)
-    cfg_yesterday = get_day_config(yesterday)
-    
+    def marcas(campo):
+        return {u.nombre: format_a1(SHEET_MARCAS, u.marcas[campo], marcas_row) for u in usuarios.values()}
+
+    return DayLayout(
+        target_date, time_row, users,
+        week=format_a1(SHEET_MARCAS, COL_WEEK, marcas_row),
+        rate=marcas("rate"),
+        obj=marcas("obj"),
+        check=marcas("check"),
+        pozo=marcas("pozo"),
+    )
+
+def materias_spec(usuarios=None):
+    """{usuario: (hoja, fila_base, materias)}, el formato de estudio_historial."""
+    usuarios = usuarios or usuarios_configurados()
+    return {u.nombre: (u.hoja, u.fila_base, u.materias) for u in usuarios.values()}
+
+# ------------------ HISTORIAL (UN SOLO BATCHGET) ------------------
+@st.cache_data(ttl=300)
+def cargar_historial(desde, hasta):
+    """Segundos por materia y día de todos los usuarios entre `desde` y `hasta` (inclusive)."""
+    desde = max(desde, FECHA_BASE)
+    spec = materias_spec()
+    rangos = rangos_historial(spec, FECHA_BASE, desde, hasta)
+    res = sheets_batch_get(st.secrets["sheet_id"], list(rangos.values()))
+    return decodificar_historial(spec, desde, hasta, res.get("valueRanges", []))
+
+def cargar_historial_ventana(nombre):
+    """Historial de la 'semana', el 'mes' o 'todo' desde FECHA_BASE."""
+    desde, hasta = ventana(nombre, _argentina_now_global().date(), FECHA_BASE)
+    return cargar_historial(desde, hasta)
+
+# ------------------ SNAPSHOT COMPARTIDO CON WRITE-THROUGH ------------------
+# Los valores crudos por rango A1 los trae un único sondeador por proceso
+# (estudio_sondeo.py) y los publica acá; las sesiones solo leen esta copia.
+# Cada escritura local se parchea al instante y sobrevive a una publicación que
+# haya salido a la hoja antes de que la escritura llegara.
+#
+# `version` sube con cada cambio (escritura de cualquier sesión o lectura nueva
+# de la hoja). Cada página escucha ese número y se vuelve a dibujar cuando se
+# mueve, así lo que escribe una sesión aparece en las demás sin leer la hoja.
+
+ESPERA_PRIMERA_LECTURA = 30
+# Cada cuánto mira cada pestaña si hay algo nuevo. El cronómetro corre en el
+# navegador, así que esto no necesita ser rápido: es una vuelta del servidor por
+# pestaña abierta, y lo nuevo de la hoja llega cada INTERVALO_SONDEO igual.
+AVISO_SEGUNDOS = 30
+
+class SnapshotCache:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.fecha = None
+        self.version = 0
+        self.valores = {}
+        self.generacion = 0
+        self.escritas = {}  # rango -> generación de la última escritura local
+
+    def aplicar_escritura(self, updates):
+        with self.lock:
+            self.generacion += 1
+            cambio = False
+            for r, v in updates:
+                cambio = cambio or self.valores.get(r) != v
+                self.valores[r] = v
+                self.escritas[r] = self.generacion
+            if cambio and self.fecha is not None:
+                self.version += 1
+
+    def publicar(self, fecha, leidos, desde_generacion):
+        """Reemplaza todo por una lectura completa, salvo lo escrito acá mientras esa lectura viajaba."""
+        with self.lock:
+            recientes = {r: g for r, g in self.escritas.items() if g > desde_generacion}
+            if fecha == self.fecha:
+                for r in recientes:
+                    if r in self.valores:
+                        leidos[r] = self.valores[r]
+            self.escritas = recientes
+            # Una vuelta del sondeador sin novedades no despierta a nadie
+            if fecha != self.fecha or leidos != self.valores:
+                self.version += 1
+            self.valores = leidos
+            self.fecha = fecha
+
+@st.cache_resource
+def get_snapshot_cache():
+    return SnapshotCache()
+
+def rangos_derivados(cfg):
+    # Celdas de 'marcas' que son fórmulas: dependen de los tiempos escritos
+    rangos = [cfg.week]
+    for celdas in (cfg.rate, cfg.obj, cfg.check, cfg.pozo):
+        rangos += celdas.values()
+    return rangos
+
+def rangos_snapshot(cfg, cfg_yesterday, usuarios=None):
     all_ranges = []
-    mapa_indices = {"materias": {}, "rates": {}, "objs": {}, "checks": {}, "week": None, "week_ayer": None, "mail_date": None, "mail_vago": None}
-    idx = 0
-    
-    for user, materias in USERS_LOCAL.items():
+    for user, materias in cfg.users.items():
         for m, info in materias.items():
-            all_ranges.append(info["est"]); mapa_indices["materias"][(user, m, "est")] = idx; idx += 1
-            all_ranges.append(info["time"]); mapa_indices["materias"][(user, m, "time")] = idx; idx += 1
-    
-    all_ranges.append(cfg["RANGO_RATE_FACU"]); mapa_indices["rates"]["Facundo"] = idx; idx += 1
-    all_ranges.append(cfg["RANGO_RATE_IVAN"]); mapa_indices["rates"]["Iván"] = idx; idx += 1
-    all_ranges.append(cfg["RANGO_OBJ_FACU"]); mapa_indices["objs"]["Facundo"] = idx; idx += 1
-    all_ranges.append(cfg["RANGO_OBJ_IVAN"]); mapa_indices["objs"]["Iván"] = idx; idx += 1
-    all_ranges.append(cfg["WEEK_RANGE"]); mapa_indices["week"] = idx; idx += 1
-    all_ranges.append(cfg_yesterday["WEEK_RANGE"]); mapa_indices["week_ayer"] = idx; idx += 1
-    
-    all_ranges.append(RANGO_FECHA_MAIL); mapa_indices["mail_date"] = idx; idx += 1
-    all_ranges.append(RANGO_FECHA_MAIL_VAGO); mapa_indices["mail_vago"] = idx; idx += 1
-    
-    all_ranges.append(cfg["RANGO_CHECK_IVAN"]); mapa_indices["checks"]["Iván"] = idx; idx += 1
-    all_ranges.append(cfg["RANGO_CHECK_FACU"]); mapa_indices["checks"]["Facundo"] = idx; idx += 1
-
-    all_ranges.append(cfg["RANGO_POZO_IVAN"]); mapa_indices["pozo_ivan"] = idx; idx += 1
-    all_ranges.append(cfg["RANGO_POZO_FACU"]); mapa_indices["pozo_facu"] = idx; idx += 1
+            all_ranges.append(info.est)
+            all_ranges.append(info.time)
+            # La fila de ayer, para cerrar sin otra lectura una sesión que cruzó la medianoche
+            all_ranges.append(cfg_yesterday.users[user][m].time)
+    all_ranges += rangos_derivados(cfg)
+    all_ranges += [cfg_yesterday.week, RANGO_FECHA_MAIL, RANGO_FECHA_MAIL_VAGO]
+    all_ranges += [get_lock_range(u, usuarios) for u in cfg.users]
+    return all_ranges
+
+def leer_celdas_agrupadas(ranges, sheet_id=None, extra=()):
+    """Un batchGet para cualquier cantidad de celdas: se piden como pocos rectángulos y se reparten.
+
+    Los rangos de `extra` viajan en el mismo pedido; sus valueRanges se devuelven aparte.
+    """
+    grupos = agrupar_celdas(ranges)
+    res = sheets_batch_get(sheet_id or st.secrets["sheet_id"], [rango for rango, _ in grupos] + list(extra))
+    value_ranges = res.get("valueRanges", [])
+    return desagrupar(grupos, value_ranges[:len(grupos)]), value_ranges[len(grupos):]
+
+def _primer_valor(vr, default=""):
+    rows = vr.get("values", [])
+    if not rows: return default
+    return rows[0][0] if rows[0] else default
 
+@st.cache_resource
+def get_registro_sesiones():
+    return RegistroSesiones()
+
+def celdas_desde_registro(cfgs, leidos, totales):
+    """Celdas HH:MM:SS que no coinciden con la suma del registro de sesiones: {rango: total}."""
+    cambios = {}
+    for cfg in cfgs:
+        for user, materias in cfg.users.items():
+            for m, info in materias.items():
+                total = totales.get(clave_dia(user, m, cfg.fecha))
+                if total is not None and segundos(leidos.get(info.time, "")) != total:
+                    cambios[info.time] = segundos_a_hms(total)
+    return cambios
+
+def leer_registro(registro, sheet_id=None):
+    """Trae lo nuevo del registro de sesiones en su propio batchGet. False (y el error guardado) si falló."""
     try:
-        res = sheets_batch_get(st.secrets["sheet_id"], all_ranges)
+        res = sheets_batch_get(sheet_id or st.secrets["sheet_id"], [registro.rango_pendiente()])
     except Exception as e:
-        st.error(f"Error API Google Sheets: {e}")
-        st.stop()
+        registro.ultimo_error = str(e)
+        return False
+    registro.agregar((res.get("valueRanges") or [{}])[0].get("values", []))
+    registro.ultimo_error = None
+    return True
 
-    values = res.get("valueRanges", [])
-    def get_val(i, default=""):
-        if i >= len(values): return default
-        vr = values[i]; rows = vr.get("values", [])
-        if not rows: return default
-        return rows[0][0] if rows[0] else default
+@st.cache_resource
+def get_sondeador():
+    sheet_id = st.secrets["sheet_id"]
+    usuarios = usuarios_configurados()
+    cache = get_snapshot_cache()
+    journal = get_journal()
+    registro = get_registro_sesiones()
+    completa_cada = float(st.secrets.get("sondeo_completo_segundos", REVISION_COMPLETA_SEGUNDOS))
+    # Revisión vista en la última lectura completa, de qué día y cuándo fue
+    ultima = {"revision": None, "fecha": None, "momento": 0.0}
+
+    def sin_cambios(fecha):
+        """Lectura de una sola celda: True si la revisión es la de la última lectura completa."""
+        if ultima["fecha"] != fecha or time.monotonic() - ultima["momento"] >= completa_cada:
+            return False
+        if registro.ultimo_error:
+            # El registro se reintenta aunque la hoja no haya cambiado
+            return False
+        res = sheets_batch_get(sheet_id, [RANGO_REVISION])
+        return texto(_primer_valor((res.get("valueRanges") or [{}])[0])) == ultima["revision"]
+
+    def leer():
+        hoy = _argentina_now_global().date()
+        fecha = hoy.strftime("%Y-%m-%d")
+        if sin_cambios(fecha):
+            return
+        cfg = get_day_config(hoy, usuarios)
+        cfg_yesterday = get_day_config(hoy - timedelta(days=1), usuarios)
+        with cache.lock:
+            generacion = cache.generacion
+        pendientes = journal.celdas_pendientes()
+        momento = time.monotonic()
+        # La revisión viaja en el mismo batchGet que el snapshot
+        leidos, _ = leer_celdas_agrupadas(rangos_snapshot(cfg, cfg_yesterday, usuarios) + [RANGO_REVISION], sheet_id)
+        ultima.update(revision=texto(leidos.get(RANGO_REVISION, "")), fecha=fecha, momento=momento)
+        # El registro va aparte: si la hoja 'sesiones' falta o falla, el snapshot se publica igual
+        registro_ok = leer_registro(registro)
+        # Lo que estaba o sigue en el journal es más nuevo que lo que devolvió la hoja
+        # (si se envió mientras leíamos, la lectura puede haber salido antes)
+        leidos.update(pendientes)
+        leidos.update(journal.celdas_pendientes())
+        # Los totales salen del registro; si una celda HH:MM:SS quedó distinta, se corrige
+        cambios = {}
+        if registro_ok:
+            cambios = celdas_desde_registro((cfg, cfg_yesterday), leidos, registro.totales_con(journal.filas_pendientes()))
+        leidos.update(cambios)
+        cache.publicar(fecha, leidos, generacion)
+        if cambios:
+            journal.registrar("materializar", list(cambios.items()))
+
+    sondeador = Sondeador(leer, float(st.secrets.get("sondeo_segundos", INTERVALO_SONDEO)))
+    # Cuando el journal sube tiempos nuevos, las fórmulas de la hoja cambian: pedimos otra vuelta
+    journal.al_enviar = lambda updates: sondeador.despertar()
+    return sondeador.iniciar()
+
+def _snapshot_publicado(fecha_str):
+    """Espera, si hace falta, a que el sondeador publique el día `fecha_str`. Nunca lee la hoja directamente."""
+    cache = get_snapshot_cache()
+
+    def listo():
+        with cache.lock:
+            return cache.fecha == fecha_str
+
+    hit = listo()
+    perfilado.contar_cache("snapshot", hit=hit)
+    if hit:
+        return
+    sondeador = get_sondeador()
+    limite = time.monotonic() + ESPERA_PRIMERA_LECTURA
+    # Se cuenta con la versión del sondeador (no con la del cache, que también suben
+    # las escrituras) y después de cada publicación se vuelve a mirar la fecha
+    while not listo():
+        with sondeador.cond:
+            version = sondeador.version
+        sondeador.despertar()
+        if not sondeador.esperar(version + 1, limite - time.monotonic()):
+            st.error(f"Error API Google Sheets: {sondeador.ultimo_error or 'la hoja no respondió a tiempo'}")
+            st.stop()
+
+# ------------------ ESTADO POR USUARIO EN LA SESIÓN ------------------
+# Materia en curso e inicio se guardan por usuario: cambiar de usuario no pisa
+# nada ni obliga a releer, el snapshot compartido ya trae a todos.
+
+def sesion_de(usuario):
+    """{'materia_activa', 'inicio_dt'} de `usuario` en esta sesión del navegador."""
+    return st.session_state.setdefault("sesion_usuarios", {}).setdefault(
+        usuario, {"materia_activa": None, "inicio_dt": None})
 
-    data_usuarios = {u: {"estado": {}, "tiempos": {}, "inicio_dt": None, "materia_activa": None} for u in USERS_LOCAL}
-    materia_en_curso = None
-    inicio_dt = None
+# ------------------ CARGA UNIFICADA (cacheada por fecha) ------------------
+# Agregamos fecha_str como argumento para que el cache se invalide al cambiar el día
+def cargar_datos_unificados(fecha_str):
+    # Obtenemos la config para el día actual
+    usuarios = usuarios_configurados()
+    cfg = get_day_config(usuarios=usuarios) # Usa la fecha actual por defecto (que coincide con fecha_str)
+    USERS_LOCAL = cfg.users
+    
+    yesterday = _argentina_now_global().date() - timedelta(days=1)
+    cfg_yesterday = get_day_config(yesterday, usuarios)
 
-    for user, materias in USERS_LOCAL.items():
-        for m in materias:
-            idx_est = mapa_indices["materias"][(user, m, "est")]
-            raw_est = get_val(idx_est)
-            data_usuarios[user]["estado"][m] = raw_est
+    _snapshot_publicado(fecha_str)
+    cache = get_snapshot_cache()
+    with cache.lock:
+        valores = dict(cache.valores)
+        version = cache.version
 
-            idx_time = mapa_indices["materias"][(user, m, "time")]
-            raw_time = get_val(idx_time)
-            secs = parse_time_cell_to_seconds(raw_time)
-            data_usuarios[user]["tiempos"][m] = segundos_a_hms(secs)
+    def get_val(r, default=""):
+        v = valores.get(r, default)
+        return default if v == "" else v
 
-            if user == st.session_state.get("usuario_seleccionado") and str(raw_est).strip() != "":
-                try:
-                    inicio_dt = parse_datetime(raw_est)
-                    materia_en_curso = m
-                except Exception:
-                    pass
+    data_usuarios = {u: {"estado": {}, "tiempos": {}, "inicio_dt": None, "materia_activa": None} for u in USERS_LOCAL}
 
-    resumen = {
-        "Facundo": {"per_min": parse_float_or_zero(get_val(mapa_indices["rates"]["Facundo"])), "obj": parse_float_or_zero(get_val(mapa_indices["objs"]["Facundo"]))},
-        "Iván": {"per_min": parse_float_or_zero(get_val(mapa_indices["rates"]["Iván"])), "obj": parse_float_or_zero(get_val(mapa_indices["objs"]["Iván"]))}
-    }
-    raw_week = get_val(mapa_indices["week"], "0")
-    balance_val = parse_float_or_zero(raw_week)
-    
-    raw_week_ayer = get_val(mapa_indices["week_ayer"], "0")
-    balance_val_ayer = parse_float_or_zero(raw_week_ayer)
+    # Decodificación por columnas: todas las celdas de tiempo juntas, todas las de estado juntas
+    TZ = _argentina_now_global().tzinfo
+    celdas = [(user, m, info) for user, materias in USERS_LOCAL.items() for m, info in materias.items()]
+    segs = columna_segundos([get_val(info.time) for _, _, info in celdas])
+    inicios = columna_epoch([get_val(info.est) for _, _, info in celdas], TZ)
+
+    for (user, m, info), secs, ts in zip(celdas, segs, inicios):
+        dt = datetime_de_epoch(ts, TZ)
+        data_usuarios[user]["estado"][m] = dt.isoformat(sep=" ", timespec="seconds") if dt else ""
+        data_usuarios[user]["tiempos"][m] = segundos_a_hms(int(secs))
+        if dt is not None:
+            data_usuarios[user]["inicio_dt"] = dt
+            data_usuarios[user]["materia_activa"] = m
+
+    nombres = list(USERS_LOCAL)
+    n = len(nombres)
+    numeros = columna_numeros(
+        [get_val(cfg.rate[u]) for u in nombres]
+        + [get_val(cfg.obj[u]) for u in nombres]
+        + [get_val(cfg.pozo[u]) for u in nombres]
+        + [get_val(cfg.week), get_val(cfg_yesterday.week)]
+    )
+    resumen = {u: {"per_min": float(numeros[i]), "obj": float(numeros[n + i])} for i, u in enumerate(nombres)}
+    pozos = {u: float(numeros[2 * n + i]) for i, u in enumerate(nombres)}
+    balance_val = float(numeros[3 * n])
+    balance_val_ayer = float(numeros[3 * n + 1])
     
-    last_mail_date = get_val(mapa_indices["mail_date"], "")
-    last_mail_vago = get_val(mapa_indices["mail_vago"], "")
+    last_mail_date = texto(get_val(RANGO_FECHA_MAIL, ""))
+    last_mail_vago = texto(get_val(RANGO_FECHA_MAIL_VAGO, ""))
 
-    checks_data = {
-        "Iván": get_val(mapa_indices["checks"]["Iván"], ""),
-        "Facundo": get_val(mapa_indices["checks"]["Facundo"], "")
-    }
-
-    pozo_ivan_val = parse_float_or_zero(get_val(mapa_indices["pozo_ivan"]))
-    pozo_facu_val = parse_float_or_zero(get_val(mapa_indices["pozo_facu"]))
+    checks_data = {u: get_val(cfg.check[u], "") for u in USERS_LOCAL}
 
-    if "usuario_seleccionado" in st.session_state:
-        st.session_state["materia_activa"] = materia_en_curso
-        st.session_state["inicio_dt"] = inicio_dt
+    # Solo pisamos el estado de la sesión cuando hay una publicación nueva del sondeador
+    if st.session_state.get("_version_snapshot") != version and "usuario_seleccionado" in st.session_state:
+        st.session_state["_version_snapshot"] = version
+        for u, d in data_usuarios.items():
+            sesion_de(u).update(materia_activa=d["materia_activa"], inicio_dt=d["inicio_dt"])
 
     return {
         "users_data": data_usuarios, 
@@ -356,139 +592,291 @@ def cargar_datos_unificados(fecha_str):
         "last_mail_date": last_mail_date,
         "last_mail_vago": last_mail_vago,
         "checks": checks_data,
-        "pozo_ivan": pozo_ivan_val,
-        "pozo_facu": pozo_facu_val
+        "pozos": pozos,
     }
 
-def batch_write(updates):
+@st.fragment(run_every=AVISO_SEGUNDOS)
+def escuchar_cambios():
+    """Rerun de la página cuando otra sesión escribió o el sondeador trajo algo nuevo. No toca la hoja."""
+    cache = get_snapshot_cache()
+    with cache.lock:
+        version = cache.version
+    if version != st.session_state.get("_version_snapshot"):
+        st.rerun()
+
+def invalidar_snapshot():
+    """Pide datos frescos al sondeador compartido; no genera una lectura por sesión."""
+    get_sondeador().despertar()
+
+# ------------------ JOURNAL DE ESCRITURAS ------------------
+JOURNAL_PATH_DEFAULT = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".journal_estudio.sqlite3")
+
+@st.cache_resource
+def get_journal():
+    sheet_id = st.secrets["sheet_id"]
+    path = st.secrets.get("journal_path", JOURNAL_PATH_DEFAULT)
+    return Journal(path, lambda updates: sheets_batch_update(sheet_id, updates),
+                   anexar=lambda filas: sheets_append(sheet_id, RANGO_APPEND, filas)).iniciar()
+
+def batch_write(updates, tipo="escritura", filas=(), forzar_lease=False):
+    """Registra celdas a escribir y `filas` para el registro de sesiones; la hoja se actualiza en segundo plano.
+
+    Devuelve False sin escribir nada si el lease del usuario lo tiene otro dispositivo.
+    """
+    user = st.session_state.get("usuario_seleccionado")
+    lease = _lease_para_escribir(user, forzar_lease)
+    if lease is None:
+        st.error(f"**{user}** está en uso en otro dispositivo: el cambio no se guardó.")
+        return False
+    updates = list(updates) + lease
     try:
-        sheets_batch_update(st.secrets["sheet_id"], updates)
-        # Limpiamos el cache usando la fecha actual
-        cargar_datos_unificados.clear()
+        get_journal().registrar(tipo, updates, filas)
     except Exception as e:
-        st.error(f"Error escribiendo Google Sheets: {e}")
+        st.error(f"Error guardando el cambio localmente: {e}")
         st.stop()
+    # Write-through: la UI ve el cambio ya, el journal lo sube a la hoja en segundo plano
+    get_snapshot_cache().aplicar_escritura(updates)
+    return True
         
-# ------------------ FUNCIONES DE LOCKEO DE SESIÓN ------------------
-
-def get_lock_range(user):
-    if user == "Facundo":
-        return RANGO_LOCK_FACUNDO
-    elif user == "Iván":
-        return RANGO_LOCK_IVAN
-    return None
-
-@st.cache_data(ttl=2)
-def get_user_lock_status(user):
-    range_str = get_lock_range(user)
-    if not range_str: return ""
+# ------------------ LEASE DE SESIÓN ------------------
+# La celda de lock de cada usuario guarda "holder|vencimiento". Un dispositivo
+# solo escribe si tiene el lease vigente: batch_write lo comprueba contra el
+# snapshot y lo toma o renueva en la misma escritura, por el journal. Dibujar la
+# página nunca toca el lease. Mientras corre una materia el lease no vence (lo
+# tiene quien la inició) y además se renueva desde mantener_lease. Si dos
+# dispositivos lo toman a la vez gana el último en llegar a la hoja; el otro lo
+# ve ajeno con el siguiente sondeo.
+
+LEASE_SEGUNDOS = 15 * 60
+# Un poco más seguido que la mitad del lease: la renovación pide que quede menos de
+# la mitad, y con vueltas justo a la mitad podría llegar cuando ya venció
+RENOVAR_LEASE_SEGUNDOS = LEASE_SEGUNDOS // 3
+
+def get_lock_range(user, usuarios=None):
+    u = (usuarios or usuarios_configurados()).get(user)
+    return f"'{SHEET_MARCAS}'!{u.lock}" if u else None
+
+# El holder es del dispositivo, no de la sesión de Streamlit: vive en una cookie,
+# así recargar la página no deja al usuario afuera de su propio lease.
+COOKIE_DISPOSITIVO = "estudio_dispositivo"
+COOKIE_SEGUNDOS = 400 * 24 * 3600
+
+def lease_holder_id():
+    if "lease_holder" not in st.session_state:
+        holder = str(st.context.cookies.get(COOKIE_DISPOSITIVO) or "")
+        if not re.fullmatch(r"[0-9a-f]{12}", holder):
+            holder = uuid.uuid4().hex[:12]
+            st.session_state["_guardar_cookie_dispositivo"] = True
+        st.session_state["lease_holder"] = holder
+    return st.session_state["lease_holder"]
+
+def guardar_cookie_dispositivo():
+    """Deja el holder nuevo en la cookie del navegador (una vez por sesión)."""
+    if not st.session_state.pop("_guardar_cookie_dispositivo", False):
+        return
+    cookie = f"{COOKIE_DISPOSITIVO}={lease_holder_id()}; max-age={COOKIE_SEGUNDOS}; path=/; SameSite=Lax"
+    iframe_html(f"<script>window.parent.document.cookie = {json.dumps(cookie)};</script>", 1)
+
+def formatear_lease(holder, vence):
+    return f"{holder}|{vence.isoformat(timespec='seconds')}"
+
+def parse_lease(raw):
+    """(holder, vencimiento) o (None, None) si la celda está vacía o tiene otra cosa."""
+    holder, sep, vence = str(raw or "").strip().partition("|")
+    if not sep or not holder:
+        return None, None
     try:
-        res = sheets_batch_get(st.secrets["sheet_id"], [range_str])
-        vr = res.get("valueRanges", [{}])[0]
-        return str(vr.get("values", [[""]])[0][0] if vr.get("values") else "").strip()
-    except Exception as e:
-        st.error(f"Error leyendo estado de lock para {user}: {e}")
-        return "ERROR_READING_LOCK"
-
-def set_user_lock_status(user, lock_value):
-    range_str = get_lock_range(user)
-    if not range_str: return False
-    try:
-        sheets_batch_update(st.secrets["sheet_id"], [(range_str, lock_value)])
-        get_user_lock_status.clear()
-        return True
-    except Exception as e:
-        st.error(f"Error escribiendo estado de lock para {user}: {e}")
-        return False
+        return holder, parse_datetime(vence)
+    except ValueError:
+        return None, None
+
+def estado_lease(raw, holder, ahora=None, estudiando=False):
+    """'propio', 'libre' (vacío o vencido) o 'ajeno'. Con una materia en curso el lease no vence."""
+    ahora = ahora or _argentina_now_global()
+    dueño, vence = parse_lease(raw)
+    if dueño is None or (vence <= ahora and not estudiando):
+        return "libre"
+    return "propio" if dueño == holder else "ajeno"
+
+def lease_en_snapshot(user):
+    cache = get_snapshot_cache()
+    with cache.lock:
+        return cache.valores.get(get_lock_range(user), "")
+
+def estudiando_en_snapshot(user):
+    """True si alguna celda de inicio de `user` está marcada (en el snapshot o recién escrita)."""
+    cfg = get_day_config()
+    cache = get_snapshot_cache()
+    with cache.lock:
+        return any(str(cache.valores.get(info.est, "")).strip()
+                   for info in cfg.users.get(user, {}).values() if info is not None)
+
+def lease_ajeno(user):
+    """True si otro dispositivo tiene el lease de `user` (solo mira el snapshot)."""
+    return estado_lease(lease_en_snapshot(user), lease_holder_id(), estudiando=estudiando_en_snapshot(user)) == "ajeno"
+
+def _lease_para_escribir(user, forzar=False):
+    """Celda de lease tomada o renovada para mandar junto con la escritura, o None si el lease es ajeno."""
+    rango = get_lock_range(user)
+    if not rango: return []
+    if not forzar and lease_ajeno(user):
+        return None
+    return [(rango, formatear_lease(lease_holder_id(), _argentina_now_global() + timedelta(seconds=LEASE_SEGUNDOS)))]
+
+def renovar_lease_si_estudia():
+    """Con una materia en curso no hay escrituras: el lease propio se renueva a mitad de su vida."""
+    user = st.session_state.get("usuario_seleccionado")
+    if sesion_de(user)["materia_activa"] is None:
+        return
+    dueño, vence = parse_lease(lease_en_snapshot(user))
+    if dueño == lease_holder_id() and (vence - _argentina_now_global()).total_seconds() < LEASE_SEGUNDOS / 2:
+        batch_write([], "heartbeat")
+
+@st.fragment(run_every=RENOVAR_LEASE_SEGUNDOS)
+def mantener_lease():
+    """Solo se dibuja con una materia en curso: renueva el lease aunque la página no se toque."""
+    renovar_lease_si_estudia()
+
+def tomar_lease_callback(user):
+    batch_write([], "lease", forzar_lease=True)
+    pedir_rerun()
+
+# ------------------ MÉTRICAS DEL DÍA ------------------
+# El balance de cada usuario (en la config): signo * balance de ayer + suma * dinero de hoy + offset
+def metricas_del_dia(usuarios, users_layout, datos, resumen, pozos, balance_ayer, activo=None):
+    """Métricas de hoy para `usuarios`, como arrays en ese orden. `activo` = (usuario, materia, segundos en curso)."""
+    matrices, incluir = [], []
+    for u in usuarios:
+        materias = list(users_layout[u].values())
+        segs = np.array([hms_a_segundos(datos[u]["tiempos"][m.nombre]) for m in materias], dtype=np.float64)
+        if activo is not None and activo[0] == u:
+            segs[[m.nombre for m in materias].index(activo[1])] += activo[2]
+        matrices.append(segs)
+        incluir.append(np.array([not m.excluir for m in materias]))
+    segundos, mascara = apilar(matrices)
+    inc, _ = apilar(incluir)
+    config = usuarios_configurados()
+    bal = [config[u].balance for u in usuarios]
+    return calcular_metricas(
+        segundos, mascara & inc.astype(bool),
+        per_min=np.array([resumen[u]["per_min"] for u in usuarios]),
+        obj=np.array([resumen[u]["obj"] for u in usuarios]),
+        activo_seg=np.array([activo[2] if activo is not None and activo[0] == u else 0 for u in usuarios]),
+        pozo=np.array([pozos[u] for u in usuarios]),
+        balance_base=balance_ayer,
+        balance_signo=np.array([b["signo"] for b in bal]),
+        balance_suma=np.array([b["suma"] for b in bal]),
+        balance_offset=np.array([b["offset"] for b in bal]),
+    )
 
 # ------------------ CALLBACKS ACTUALIZADOS ------------------
 def start_materia_callback(usuario, materia):
     try:
         cfg = get_day_config() # Obtenemos configuración dinámica
-        info = cfg["USERS"][usuario][materia]
+        info = cfg.users[usuario][materia]
         
         now_str = ahora_str()
-        updates = [(info["est"], now_str)] + [
-            (m_datos["est"], "")
-            for m_datos in cfg["USERS"][usuario].values()
+        updates = [(info.est, now_str)] + [
+            (m_datos.est, "")
+            for m_datos in cfg.users[usuario].values()
             if m_datos is not None and m_datos is not info
         ]
-        batch_write(updates)
-        st.session_state["materia_activa"] = materia
-        st.session_state["inicio_dt"] = parse_datetime(now_str)
+        if batch_write(updates, "start"):
+            sesion_de(usuario).update(materia_activa=materia, inicio_dt=parse_datetime(now_str))
     except Exception as e:
         st.error(f"start_materia error: {e}")
     finally:
         pedir_rerun()
 
+def _celda_tiempo(usuario, materia, dia):
+    # El layout de cada día ya tiene la fila correcta para cada usuario
+    return get_day_config(dia).users[usuario][materia].time
+
+def leer_celdas(ranges, conocidos=None):
+    """Valores crudos de las celdas pedidas: journal, snapshot y, solo si algo quedó afuera, un batchGet."""
+    conocidos = dict(conocidos or {})
+    for r, v in get_journal().celdas_pendientes().items():
+        if r in ranges:
+            conocidos.setdefault(r, v)
+    cache = get_snapshot_cache()
+    with cache.lock:
+        if cache.fecha is not None:
+            for r in ranges:
+                if r not in conocidos and r in cache.valores:
+                    conocidos[r] = cache.valores[r]
+    faltan = [r for r in dict.fromkeys(ranges) if r not in conocidos]
+    if faltan:
+        res = sheets_batch_get(st.secrets["sheet_id"], faltan)
+        for r, vr in zip(faltan, res.get("valueRanges", [])):
+            conocidos[r] = _primer_valor(vr)
+    return conocidos
+
+def registro_disponible():
+    """Sin el registro leído no se sabe qué parte de la celda HH:MM:SS ya está en él: una
+    fila de legado contaría dos veces esas sesiones. Avisa y pide otro intento."""
+    if get_registro_sesiones().disponible():
+        return True
+    st.error(f"Todavía no se pudo leer la hoja '{SHEET_SESIONES}' (registro de sesiones): "
+             "no se guardó el cambio. Probá de nuevo en un momento.")
+    invalidar_snapshot()
+    pedir_rerun()
+    return False
+
+def _base_registro(usuario, materia, dia, totales):
+    """(segundos que ya cuenta el día, filas de legado a agregar antes de sumarle algo).
+
+    Si el día todavía no está en el registro, lo que tenga la celda HH:MM:SS entra como legado.
+    """
+    total = totales.get(clave_dia(usuario, materia, dia))
+    if total is not None:
+        return total, []
+    celda = _celda_tiempo(usuario, materia, dia)
+    base = segundos(leer_celdas([celda]).get(celda, ""))
+    return base, [fila_legado(usuario, materia, dia, base)] if base else []
+
 def stop_materia_callback(usuario, materia):
     try:
         cfg = get_day_config() # Config actual
-        info = cfg["USERS"][usuario][materia]
+        info = cfg.users[usuario][materia]
+        fin = _argentina_now_global()
         
-        inicio = st.session_state.get("inicio_dt")
-        prev_est = ""
-        if inicio is None or st.session_state.get("materia_activa") != materia:
-            st.warning("Marca de inicio no encontrada en session_state, releyendo de la hoja...")
+        sesion = sesion_de(usuario)
+        inicio = sesion["inicio_dt"]
+        if inicio is None or sesion["materia_activa"] != materia:
             try:
-                res = sheets_batch_get(st.secrets["sheet_id"], [info["est"]])
-                vr = res.get("valueRanges", [{}])[0]
-                prev_est = vr.get("values", [[""]])[0][0] if vr.get("values") else ""
-                if not prev_est:
+                previos = leer_celdas([info.est])
+                TZ = fin.tzinfo
+                inicio = datetime_de_epoch(epoch(previos.get(info.est, ""), TZ), TZ)
+                if inicio is None:
                       st.error("No hay marca de inicio registrada (no se puede detener).")
                       pedir_rerun()
                       return
-                inicio = parse_datetime(prev_est)
             except Exception as e:
                  st.error(f"Error leyendo marca de inicio de la hoja: {e}")
                  pedir_rerun()
                  return
 
-        fin = _argentina_now_global()
         if fin <= inicio:
             st.error("Tiempo inválido. La hora de fin es anterior a la de inicio.")
-            batch_write([(info["est"], "")])
+            batch_write([(info.est, "")], "stop")
             pedir_rerun()
             return
 
-        midnight = datetime.combine(inicio.date() + timedelta(days=1), dt_time(0,0)).replace(tzinfo=inicio.tzinfo)
-        partes = []
-        if inicio.date() == fin.date():
-            partes.append((inicio, fin))
-        else:
-            partes.append((inicio, midnight))
-            partes.append((midnight, fin))
-
-        updates = []
-        for (p_inicio, p_fin) in partes:
-            segs = int((p_fin - p_inicio).total_seconds())
-            
-            # --- Corrección dinámica de fila para cada fragmento de tiempo ---
-            # Si cruza la medianoche, esto escribe en la fila correspondiente al día del fragmento
-            # Usar la base correcta según el usuario
-            base_correcta = FILA_BASE2 if usuario == "Facundo" else FILA_BASE
-            target_row = base_correcta + (p_inicio.date() - FECHA_BASE).days
-            
-            # Reconstruimos el rango de tiempo usando la fila correcta
-            # Usamos una instancia temporal de config para obtener la columna base
-            # Como la columna B/C/D no cambia, usamos la config actual para obtener la letra
-            # y reemplazamos el número de fila.
-            current_time_range = cfg["USERS"][usuario][materia]["time"]
-            time_cell_for_row = replace_row_in_range(current_time_range, target_row)
-            
-            try:
-                res2 = sheets_batch_get(st.secrets["sheet_id"], [time_cell_for_row])
-                vr2 = res2.get("valueRanges", [{}])[0]
-                prev_raw = vr2.get("values", [[""]])[0][0] if vr2.get("values") else ""
-            except:
-                prev_raw = ""
-            new_secs = parse_time_cell_to_seconds(prev_raw) + segs
-            updates.append((time_cell_for_row, segundos_a_hms(new_secs)))
-
-        updates.append((info["est"], ""))
-        batch_write(updates)
-        st.session_state["materia_activa"] = None
-        st.session_state["inicio_dt"] = None
+        # Una fila por día en el registro (si cruzó la medianoche, cada parte en su día).
+        # Las celdas HH:MM:SS se actualizan con la suma del registro, sin leer la hoja.
+        if not registro_disponible():
+            return
+        totales = get_registro_sesiones().totales_con(get_journal().filas_pendientes())
+        filas, updates = [], []
+        for fila in filas_sesion(usuario, materia, inicio, fin):
+            dia = date.fromisoformat(fila[5])
+            base, legado = _base_registro(usuario, materia, dia, totales)
+            filas += legado + [fila]
+            updates.append((_celda_tiempo(usuario, materia, dia), segundos_a_hms(base + fila[4])))
+
+        updates.append((info.est, ""))
+        if batch_write(updates, "stop", filas):
+            sesion_de(usuario).update(materia_activa=None, inicio_dt=None)
     except Exception as e:
         st.error(f"stop_materia error: {e}")
     finally:
@@ -499,24 +887,33 @@ def main():
 
     # Borrar caché si se acaba de entrar a la página (controlado por app.py)
     if st.session_state.get("clear_cache_estudio", False):
-        cargar_datos_unificados.clear()
+        invalidar_snapshot()
         st.session_state["clear_cache_estudio"] = False
 
     if st.session_state.get("_do_rerun", False):
         st.session_state["_do_rerun"] = False
         st.rerun()
         
-    if "usuario_seleccionado" not in st.session_state or st.session_state["usuario_seleccionado"] not in ["Facundo", "Iván"]:
+    usuarios = usuarios_configurados()
+    if "usuario_seleccionado" not in st.session_state or st.session_state["usuario_seleccionado"] not in usuarios:
         st.error("Error: Usuario no seleccionado en la sesión. Reinicia la aplicación.")
         st.stop()
         
     # --- Carga de datos ---
     hoy_str = _argentina_now_global().strftime("%Y-%m-%d")
     datos_globales = cargar_datos_unificados(hoy_str) # Pasamos la fecha string para cache key
+
+    journal = get_journal()
+    if journal.ultimo_error:
+        st.warning(f"⏳ {journal.cantidad_pendientes()} cambio(s) sin sincronizar con Google Sheets. Se reintenta automáticamente.")
+    registro_error = get_registro_sesiones().ultimo_error
+    if registro_error:
+        st.warning(f"No se pudo leer la hoja '{SHEET_SESIONES}' (registro de sesiones): los tiempos se muestran como están en 'marcas'. {registro_error}")
+    perfilado.marcar("carga_datos")
     
     # Recargamos la config local para usar en la UI
-    cfg = get_day_config()
-    USERS_LOCAL = cfg["USERS"]
+    cfg = get_day_config(usuarios=usuarios)
+    USERS_LOCAL = cfg.users
     
     datos = datos_globales["users_data"]
     resumen_marcas = datos_globales["resumen"]
@@ -526,22 +923,33 @@ def main():
     last_mail_vago_str = datos_globales["last_mail_vago"]
     checks_data = datos_globales["checks"]
 
-    pozo_ivan = datos_globales["pozo_ivan"]
-    pozo_facu = datos_globales["pozo_facu"]
+    pozos = datos_globales["pozos"]
 
     USUARIO_ACTUAL = st.session_state["usuario_seleccionado"]
-    OTRO_USUARIO = "Iván" if USUARIO_ACTUAL == "Facundo" else "Facundo"
-
-    materia_en_curso = st.session_state.get("materia_activa")
-    inicio_dt = st.session_state.get("inicio_dt")
+    OTROS_USUARIOS = [u for u in usuarios if u != USUARIO_ACTUAL]
+
+    # --- Lease: un solo dispositivo escribe por usuario ---
+    # Solo se mira el snapshot: el lease se toma con la primera escritura, no al dibujar
+    puede_escribir = not lease_ajeno(USUARIO_ACTUAL)
+    if not puede_escribir:
+        _, vence = parse_lease(lease_en_snapshot(USUARIO_ACTUAL))
+        hasta = f" hasta las {vence.strftime('%H:%M')}" if vence and vence > _argentina_now_global() else ""
+        st.warning(f"Solo lectura: **{USUARIO_ACTUAL}** está en uso en otro dispositivo{hasta}. Los botones quedan bloqueados.", icon="📵")
+        st.button("📲 Usar en este dispositivo", use_container_width=True,
+                  on_click=tomar_lease_callback, args=(USUARIO_ACTUAL,))
+    guardar_cookie_dispositivo()
+    perfilado.marcar("lease")
+
+    sesion = sesion_de(USUARIO_ACTUAL)
+    materia_en_curso = sesion["materia_activa"]
+    inicio_dt = sesion["inicio_dt"]
 
     if materia_en_curso is None:
         for m, est_raw in datos[USUARIO_ACTUAL]["estado"].items():
             if str(est_raw).strip() != "":
                 try:
                     inicio_dt_sheet = parse_datetime(est_raw)
-                    st.session_state["materia_activa"] = m
-                    st.session_state["inicio_dt"] = inicio_dt_sheet
+                    sesion.update(materia_activa=m, inicio_dt=inicio_dt_sheet)
                     materia_en_curso = m
                     inicio_dt = inicio_dt_sheet
                 except Exception:
@@ -550,43 +958,32 @@ def main():
 
     usuario_estudiando = materia_en_curso is not None
 
-    materia_otro = next((m for m, v in datos[OTRO_USUARIO]["estado"].items() if str(v).strip() != ""), "")
-    otro_estudiando = materia_otro != ""
+    # Qué están estudiando los demás (llega por el snapshot compartido, sin leer la hoja)
+    materias_otros = {
+        u: next((m for m, v in datos[u]["estado"].items() if str(v).strip() != ""), "")
+        for u in OTROS_USUARIOS
+    }
 
     def circle(color):
         return (f'<span style="display:inline-flex; align-items:center; justify-content:center; '
                 f'width:10px; height:10px; border-radius:50%; background:{color}; '
                 f'margin-right:6px; flex-shrink:0;"></span>')
 
-    circle_usuario = circle("#00e676" if usuario_estudiando else "#ffffff")
-    circle_otro = circle("#00e676" if otro_estudiando else "#ffffff")
-
     tiempo_anadido_seg = 0
     if usuario_estudiando and inicio_dt is not None:
         tiempo_anadido_seg = int((_argentina_now_global() - inicio_dt).total_seconds())
 
-    def calcular_metricas(usuario, tiempo_activo_seg_local=0):
-        per_min = resumen_marcas[usuario]["per_min"]
-        objetivo = resumen_marcas[usuario]["obj"]
-        total_min = 0.0
-
-        # Usamos USERS_LOCAL (dinámico)
-        for materia, info in USERS_LOCAL[usuario].items():
-            if info.get("excluir"):
-                continue
-            base_seg = hms_a_segundos(datos[usuario]["tiempos"][materia])
-            segs_materia = base_seg
-            if usuario_estudiando and usuario == USUARIO_ACTUAL and materia == materia_en_curso:
-                segs_materia += tiempo_activo_seg_local
-            total_min += segs_materia / 60
-
-        progreso_en_dinero = (tiempo_activo_seg_local / 60) * per_min
-        m_tot = total_min * per_min
-        return m_tot, per_min, objetivo, total_min, progreso_en_dinero
-
-    m_tot, m_rate, m_obj, total_min, progreso_en_dinero = calcular_metricas(USUARIO_ACTUAL, tiempo_anadido_seg)
-    pago_objetivo = m_rate * m_obj
-    progreso_pct = min(m_tot / max(1, pago_objetivo), 1.0) * 100
+    # --- Métricas de todos los usuarios en una sola pasada del motor (el actual primero) ---
+    metricas = metricas_del_dia(
+        [USUARIO_ACTUAL] + OTROS_USUARIOS, USERS_LOCAL, datos, resumen_marcas,
+        pozos, balance_val_ayer_raw,
+        activo=(USUARIO_ACTUAL, materia_en_curso, max(0, tiempo_anadido_seg)) if usuario_estudiando else None,
+    )
+    yo = {k: float(v[0]) for k, v in metricas.items()}
+    m_tot, total_min = yo["dinero"], yo["total_min"]
+    m_rate, m_obj = resumen_marcas[USUARIO_ACTUAL]["per_min"], yo["objetivo_min"]
+    pago_objetivo = yo["pago_objetivo"]
+    progreso_pct = yo["progreso_pct"]
     if progreso_pct >= 100 and "password_triggered" not in st.session_state:
         st.session_state.goal_completed = True
         st.session_state.password_triggered = True
@@ -596,38 +993,17 @@ def main():
     objetivo_hms = segundos_a_hms(int(m_obj * 60))
     total_hms = segundos_a_hms(int(total_min * 60))
 
-    pozo_valor = pozo_facu if USUARIO_ACTUAL == "Facundo" else pozo_ivan
-    pozo_valor -= m_tot
-    if pozo_valor < 0:
-        m_tot += pozo_valor
-        pozo_valor = 0.0
+    pozo_valor = yo["pozo_valor"]
     pozo_color = "#ff1744" if round(pozo_valor) != 0 else "#aaa"
-
-    # --- NUEVO CÁLCULO: Tiempo equivalente del Pozo ---
-    m_tot, m_rate, m_obj, total_min, progreso_en_dinero = calcular_metricas(USUARIO_ACTUAL, tiempo_anadido_seg)
-    
-    # --- CÁLCULO DEL TIEMPO DEL POZO EN FORMATO DECIMAL ---
     paga_por_hora = m_rate * 60
-    if paga_por_hora > 0:
-        pozo_horas_decimal = pozo_valor / paga_por_hora
-    else:
-        pozo_horas_decimal = 0.0
-
-    pago_objetivo = m_rate * m_obj
+    pozo_horas_decimal = yo["pozo_horas"]
 
-    balance_val = balance_val_ayer_raw
-    if USUARIO_ACTUAL == "Facundo":
-        balance_val = -balance_val
-    if USUARIO_ACTUAL == "Facundo":
-        balance_val += m_tot
+    balance_val = yo["balance"]
     balance_color = "#00e676" if balance_val > 0 else "#ff1744" if balance_val < 0 else "#aaa"
-    if USUARIO_ACTUAL == "Facundo":
-        balance_str = f"${balance_val:.2f}" if balance_val > 0 else (f"-${abs(balance_val):.2f}" if balance_val < 0 else "$0.00")
-    else:
-        balance_str = f"${balance_val-15000:.2f}" if balance_val-15000 > 0 else (f"-${abs(balance_val-15000):.2f}" if balance_val-15000 < 0 else "$0.00")
+    balance_str = f"${balance_val:.2f}" if balance_val > 0 else (f"-${abs(balance_val):.2f}" if balance_val < 0 else "$0.00")
 
     # --- LÓGICA DE CONDICIONAL PARA MOSTRAR DINERO ---
-    mostrar_dinero_detallado = (USUARIO_ACTUAL == "Facundo")
+    mostrar_dinero_detallado = usuarios[USUARIO_ACTUAL].dinero_detallado
 
     # --- NUEVO: LÓGICA DE HORA DE FINALIZACIÓN ---
     hora_fin_html = "<div></div>"
@@ -642,23 +1018,39 @@ def main():
             hora_fin_html = f'<div></div>'
 
     if mostrar_dinero_detallado:
-        # Caso Facundo: Muestra dinero en todos lados
-        pozo_html = f'<strong>{pozo_horas_decimal:.2f}hs</strong> <span style="color:#666; margin-left:4px;">(${pozo_valor:.2f})</span>'
-        total_html = f'{total_hms} | ${m_tot:.2f}'
-        balance_html = f'<div>Balance: <span style="color:{balance_color};">{balance_str}</span></div>'
+        # Muestra dinero en todos lados
+        pozo_html = f'<strong id="pozo-hs">{pozo_horas_decimal:.2f}hs</strong> <span style="color:#666; margin-left:4px;">(<span id="pozo-dinero">${pozo_valor:.2f}</span>)</span>'
+        total_html = f'<span id="total-hms">{total_hms}</span> | <span id="total-dinero">${m_tot:.2f}</span>'
+        balance_html = f'<div>Balance: <span id="balance" style="color:{balance_color};">{balance_str}</span></div>'
         objetivo_html = f'<div>{objetivo_hms} | ${pago_objetivo:.2f}</div>'
     else:
-        # Caso Iván: Solo muestra dinero en el Balance con el nuevo texto
-        pozo_html = f'<strong>{pozo_horas_decimal:.2f}hs</strong>'
-        total_html = f'{total_hms}'
-        # Aquí activamos el balance para Iván con tu frase personalizada
+        # Sin dinero: en el lugar del Balance va la hora de finalización
+        pozo_html = f'<strong id="pozo-hs">{pozo_horas_decimal:.2f}hs</strong>'
+        total_html = f'<span id="total-hms">{total_hms}</span>'
         balance_html = hora_fin_html
         hora_fin_html = f'<div></div>'
         objetivo_html = f'<div>{objetivo_hms}</div>'
 
+    # --- Tasas por segundo para el reloj del navegador ---
+    # Solo suma al total si la materia activa no está excluida (ej. Trabajo)
+    activo_cuenta = usuario_estudiando and not USERS_LOCAL[USUARIO_ACTUAL][materia_en_curso].excluir
+    pesos_por_seg = m_rate / 60 if activo_cuenta else 0.0
+    ticks_hoy = [
+        tick("total-hms", "hms", total_min * 60, 1 if activo_cuenta else 0),
+        tick("total-dinero", "dinero", m_tot, pesos_por_seg),
+        tick("barra", "barra", progreso_pct, pesos_por_seg / max(1, pago_objetivo) * 100, max=100),
+        tick("pozo-dinero", "dinero", pozo_valor, -pesos_por_seg, min=0),
+        tick("pozo-hs", "horas", pozo_horas_decimal, -1 / 3600 if activo_cuenta and paga_por_hora > 0 else 0, min=0),
+    ]
+    if mostrar_dinero_detallado:
+        # El balance suma el dinero de hoy multiplicado por `suma` de la config del usuario
+        ticks_hoy.append(tick("balance", "balance", balance_val, usuarios[USUARIO_ACTUAL].balance["suma"] * pesos_por_seg))
+
+    perfilado.marcar("metricas")
+
     # --- Actualizar Placeholder Global ---
     with st.container():
-        st.markdown(f"""
+        html_hoy = f"""
             <div style="background-color: #1e1e1e; padding: 15px; border-radius: 10px; margin-bottom: 20px;">
                 <div style="display:flex; justify-content:space-between; align-items:center;">
                     <div style="font-size: 1.2rem; color: #aaa;">Hoy</div>
@@ -671,7 +1063,7 @@ def main():
                 </div>
                 <div style="width: 100%; font-size: 2.2rem; font-weight: bold; color: #fff; line-height: 1;">{total_html}</div>
                 <div style="width:100%; background-color:#333; border-radius:10px; height:12px; margin: 15px 0;">
-                    <div style="width:{progreso_pct}%; background-color:{color_bar}; height:100%; border-radius:10px; transition: width 0.5s;"></div>
+                    <div id="barra" style="width:{progreso_pct}%; background-color:{color_bar}; height:100%; border-radius:10px; transition: width 0.5s;"></div>
                 </div>
                 <div style="display:flex; justify-content:space-between; color:#888;">
                     {balance_html}
@@ -679,27 +1071,25 @@ def main():
                     {objetivo_html}
                 </div>
             </div>
-        """, unsafe_allow_html=True)
-
-        o_tot, o_rate, o_obj, total_min_otro, _ = calcular_metricas(OTRO_USUARIO)
-        o_pago_obj = o_rate * o_obj
-        o_progreso_pct = min(o_tot / max(1, o_pago_obj), 1.0) * 100
-        o_color_bar = "#00e676" if o_progreso_pct >= 90 else "#ffeb3b" if o_progreso_pct >= 50 else "#ff1744"
-        o_obj_hms = segundos_a_hms(int(o_obj * 60))
-        o_total_hms = segundos_a_hms(int(total_min_otro * 60))
-
-        materia_visible = 'visible' if materia_otro else 'hidden'
-        materia_nombre_html = f'<span style="color:#00e676; margin-left:6px; visibility:{materia_visible};">{materia_otro if materia_otro else ""}</span>'
+        """
+        if usuario_estudiando:
+            html_vivo(html_hoy, ticks_hoy, height=175)
+        else:
+            st.markdown(html_hoy, unsafe_allow_html=True)
+
+        if OTROS_USUARIOS:
+            estados_otros = "".join(
+                f'<span style="display:inline-flex; align-items:center; margin-right:14px;">'
+                f'{circle("#00e676" if materias_otros[u] else "#ffffff")}{u}'
+                f'<span style="color:#00e676; margin-left:6px;">{materias_otros[u]}</span></span>'
+                for u in OTROS_USUARIOS
+            )
+            st.markdown(f'<div style="display:flex; flex-wrap:wrap; color:#aaa; font-size:0.9rem; margin-bottom:10px;">{estados_otros}</div>',
+                        unsafe_allow_html=True)
 
         with st.expander("ℹ️ No pensar, actuar."):
-            md_content = st.secrets["facundo_md"] if USUARIO_ACTUAL == "Facundo" else st.secrets["ivan_md"]
-            st.markdown(md_content)
-            
-        # condiciono la aparición del botón de actualización
-        if usuario_estudiando:
-            if st.button("🔄 Actualizar", use_container_width=True):
-                cargar_datos_unificados.clear()
-                st.rerun()
+            md_key = usuarios[USUARIO_ACTUAL].md
+            st.markdown(st.secrets.get(md_key, "") if md_key else "")
     
     # --- Actualizar Placeholders de Materias y Botones ---
     mis_materias = USERS_LOCAL[USUARIO_ACTUAL]
@@ -714,10 +1104,13 @@ def main():
 
         tiempo_total_hms = segundos_a_hms(tiempo_total_seg)
         badge_html = f'<div class="status-badge status-active">🟢 Estudiando...</div>' if en_curso else ''
-        html_card = f"""<div class="materia-card"><div class="materia-title">{materia}</div>{badge_html}<div class="materia-time">{tiempo_total_hms}</div></div>"""
+        html_card = f"""<div class="materia-card"><div class="materia-title">{materia}</div>{badge_html}<div class="materia-time" id="materia-tiempo">{tiempo_total_hms}</div></div>"""
 
         with st.container():
-            st.markdown(html_card, unsafe_allow_html=True)
+            if en_curso:
+                html_vivo(html_card, [tick("materia-tiempo", "hms", tiempo_total_seg, 1)], height=165)
+            else:
+                st.markdown(html_card, unsafe_allow_html=True)
 
             key_start = sanitize_key(f"start_{USUARIO_ACTUAL}_{materia}")
             key_stop = sanitize_key(f"stop_{USUARIO_ACTUAL}_{materia}")
@@ -726,11 +1119,11 @@ def main():
             cols = st.columns([1,1,1])
             with cols[0]:
                 if en_curso:
-                    st.button(f"⛔ DETENER {materia[:14]}", key=key_stop, use_container_width=True,
+                    st.button(f"⛔ DETENER {materia[:14]}", key=key_stop, use_container_width=True, disabled=not puede_escribir,
                               on_click=stop_materia_callback, args=(USUARIO_ACTUAL, materia))
                 else:
                     if materia_en_curso is None:
-                        st.button("▶ INICIAR", key=key_start, use_container_width=True,
+                        st.button("▶ INICIAR", key=key_start, use_container_width=True, disabled=not puede_escribir,
                                   on_click=start_materia_callback, args=(USUARIO_ACTUAL, materia))
                     else:
                         st.button("...", disabled=True, key=key_disabled, use_container_width=True)
@@ -742,7 +1135,7 @@ def main():
                     new_val = st.text_input("Tiempo (HH:MM:SS)", value=datos[USUARIO_ACTUAL]["tiempos"][materia], key=input_key)
 
                     def save_correction_callback(materia_key):
-                        if st.session_state.get("materia_activa") is not None:
+                        if sesion_de(USUARIO_ACTUAL)["materia_activa"] is not None:
                             st.error("⛔ No podés corregir el tiempo mientras estás estudiando.")
                             pedir_rerun()
                             return
@@ -753,14 +1146,22 @@ def main():
                             pedir_rerun()
                             return
 
+                        if not registro_disponible():
+                            return
+
                         try:
                             segs = hms_a_segundos(val)
                             hhmmss = segundos_a_hms(segs)
-                            # Usamos config dinámica para saber en qué celda escribir AHORA
-                            cfg_corr = get_day_config()
-                            time_cell_for_row = cfg_corr["USERS"][USUARIO_ACTUAL][materia_key]["time"]
-                            batch_write([(time_cell_for_row, hhmmss)])
-                            st.success("Tiempo corregido correctamente.")
+                            # La corrección es una fila de ajuste por la diferencia con el total del registro
+                            ahora = _argentina_now_global()
+                            hoy = ahora.date()
+                            totales = get_registro_sesiones().totales_con(get_journal().filas_pendientes())
+                            base, filas = _base_registro(USUARIO_ACTUAL, materia_key, hoy, totales)
+                            if segs != base:
+                                filas.append(fila_ajuste(USUARIO_ACTUAL, materia_key, hoy, segs - base, ahora))
+                            time_cell_for_row = _celda_tiempo(USUARIO_ACTUAL, materia_key, hoy)
+                            if batch_write([(time_cell_for_row, hhmmss)], "correccion", filas):
+                                st.success("Tiempo corregido correctamente.")
                         except Exception as e:
                             st.error(f"Error al corregir el tiempo: {e}")
                         finally:
@@ -769,9 +1170,14 @@ def main():
                     if en_curso or usuario_estudiando:
                         st.info("⛔ No podés corregir el tiempo mientras estás estudiando.")
                     else:
-                        if st.button("Guardar Corrección", key=f"save_{sanitize_key(materia)}", on_click=save_correction_callback, args=(materia,)):
+                        if st.button("Guardar Corrección", key=f"save_{sanitize_key(materia)}", on_click=save_correction_callback, args=(materia,), disabled=not puede_escribir):
                             pass
 
+    if usuario_estudiando:
+        mantener_lease()
+    escuchar_cambios()
+    perfilado.marcar("html")
+
 if __name__ == "__main__":
     try:
         main()
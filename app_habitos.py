@@ -1,5 +1,5 @@
 import streamlit as st
-import gspread
+import uuid
 from datetime import datetime, timedelta
 
 try:
@@ -13,7 +13,13 @@ except Exception:
     except Exception:
         pytz = None
 
-import json
+import numpy as np
+import perfilado
+from google_sesion import get_gspread_client
+from sheet_layout import indice_a_col
+from habitos_grilla import DiaHabitos, CacheDias, IndiceFechas, EscritorHabitos, texto_fecha
+from habitos_historial import (CacheHistorial, MULTA_POR_HABITO, GRUPOS, matriz_hechos, armar_historial,
+                               rachas, tasas_semanales, multas)
 
 # ---------------------------------------------------------------
 # BLOQUEO POR CONTRASEÑA REMOVED
@@ -37,9 +43,8 @@ def run():
         # Función para obtener la hora actual (no usada para el log, solo informativa)
         return _argentina_now_global().strftime('%H:%M:%S')
 
-    def get_argentina_date_str():
-        dt = _argentina_now_global()
-        return f"{dt.day:02d}/{dt.month:02d}"
+    def get_argentina_date():
+        return _argentina_now_global().date()
 
     # -------------------------------------------------------------------
     # CONFIG DESDE SECRETS
@@ -54,21 +59,13 @@ def run():
     @st.cache_resource
     def connect_to_google_sheets():
         try:
-            # 1) Intentar desde secrets
-            service_account_data = None
-            sa = st.secrets["service_account"]
-            if isinstance(sa, str):
-                service_account_data = json.loads(sa)
-            elif isinstance(sa, dict):
-                service_account_data = sa
-
-            if service_account_data:
-                gc = gspread.service_account_from_dict(service_account_data)
+            # Mismas credenciales, token y pool que Estudio (google_sesion.py)
+            perfilado.cache_miss("gspread.conexion")
+            with perfilado.llamada_externa("gspread.open"):
+                gc = get_gspread_client()
                 spreadsheet = gc.open(GOOGLE_SHEET_NAME)
                 worksheet = spreadsheet.worksheet(WORKSHEET_NAME)
-                return worksheet
-
-            return None
+            return worksheet
 
         except Exception as e:
             st.error(f"Error al conectar a Google Sheets: {e}")
@@ -91,79 +88,199 @@ def run():
             return []
 
     # -------------------------------------------------------------------
-    # CONFIGURACIÓN DEL ESTADO DIARIO
+    # CONFIGURACIÓN DEL ESTADO DIARIO (una lectura por día, en memoria)
     # -------------------------------------------------------------------
+    @st.cache_resource
+    def get_cache_dias():
+        return CacheDias()
+
+    @st.cache_resource
+    def get_indice_fechas():
+        # Opcional en secrets: habitos_fecha_base = "YYYY-MM-DD" y habitos_fila_base = fila de esa
+        # fecha. Sin eso se calibra con una lectura de la columna A la primera vez.
+        fecha_base = st.secrets.get("habitos_fecha_base")
+        return IndiceFechas(datetime.strptime(fecha_base, "%Y-%m-%d").date() if fecha_base else None,
+                            st.secrets.get("habitos_fila_base"))
+
+    def leer_fila(worksheet, fila):
+        # Encabezados y fila de hoy en un solo values:batchGet
+        with perfilado.llamada_externa("gspread.batch_get"):
+            headers, row = worksheet.batch_get(["1:1", f"{fila}:{fila}"])
+        return (headers[0] if headers else []), (row[0] if row else [])
+
+    def leer_dia(worksheet, today):
+        indice = get_indice_fechas()
+        today_str = texto_fecha(today)
+        fila = indice.fila(today)
+        if fila is not None:
+            headers, today_row = leer_fila(worksheet, fila)
+            # La celda A de la fila calculada confirma el índice
+            if today_row and str(today_row[0]).strip() == today_str:
+                return DiaHabitos(today, fila, headers, today_row)
+        # Sin ancla o la hoja cambió: se recalibra con la columna A (una vez)
+        with perfilado.llamada_externa("gspread.col_values"):
+            all_dates = worksheet.col_values(1)
+        fila = indice.calibrar(all_dates, today)
+        if fila is None:
+            return DiaHabitos(today, None, [], [])
+        headers, today_row = leer_fila(worksheet, fila)
+        return DiaHabitos(today, fila, headers, today_row)
+
     def setup_daily_state(worksheet):
-        today_str = get_argentina_date_str()
+        today = get_argentina_date()
 
         pending_habits_list = []
         if worksheet is not None:
             try:
-                all_dates = worksheet.col_values(1)
-                date_row_index = all_dates.index(today_str) if today_str in all_dates else -1
-
-                if date_row_index != -1:
-                    today_row = worksheet.row_values(date_row_index + 1)
-                    headers = worksheet.row_values(1)
-
-                    for habit in st.session_state.all_habits:
-                        name = habit["name"]
-
-                        if name in headers:
-                            col_idx = headers.index(name)
-                            if col_idx >= len(today_row) or not today_row[col_idx].strip():
-                                pending_habits_list.append(name)
-                        else:
-                            pending_habits_list.append(name)
+                dia, hit = get_cache_dias().obtener(today, lambda: leer_dia(worksheet, today))
+                perfilado.contar_cache("habitos.dia", hit)
+                # Lo que se está mandando todavía no llegó a la hoja, pero ya no está pendiente
+                sin_confirmar = get_escritor(worksheet).nombres_sin_confirmar()
+                pending_habits_list = [
+                    n for n in dia.pendientes([h["name"] for h in st.session_state.all_habits]) if n not in sin_confirmar
+                ]
             except Exception:
                 pass
 
         st.session_state.todays_pending_habits = pending_habits_list
 
+    # -------------------------------------------------------------------
+    # REGISTRO DE HÁBITOS (optimista, la hoja se escribe en segundo plano)
+    # -------------------------------------------------------------------
+    # El click marca el hábito en memoria y encola la escritura: el rerun del
+    # click ya lo muestra hecho. Los taps seguidos salen juntos en un batchUpdate;
+    # si falla, la memoria se invalida (el hábito reaparece) y se avisa con un toast.
+    @st.cache_resource
+    def get_escritor(_worksheet):
+        def enviar(data):
+            with perfilado.llamada_externa("gspread.batch_update"):
+                _worksheet.batch_update(data, value_input_option="USER_ENTERED")
+        return EscritorHabitos(enviar, al_fallar=lambda: get_cache_dias().invalidar()).iniciar()
+
+    def sesion_habitos():
+        if "habitos_sesion" not in st.session_state:
+            st.session_state.habitos_sesion = uuid.uuid4().hex
+        return st.session_state.habitos_sesion
+
     def log_habit_grid(habit_name, worksheet):
         try:
             if worksheet is not None:
-                today_str = get_argentina_date_str()
-                all_dates = worksheet.col_values(1)
-                date_row = all_dates.index(today_str) + 1
-                headers = worksheet.row_values(1)
-
-                log_value = 1
-
-                if habit_name in headers:
-                    col = headers.index(habit_name) + 1
-                else:
-                    if BOUNDARY_COLUMN in headers:
-                        boundary = headers.index(BOUNDARY_COLUMN)
-                        col = None
-                        for idx in range(1, boundary + 1):
-                            if idx - 1 >= len(headers) or not headers[idx - 1].strip():
-                                col = idx
-                                break
-                        if col is None:
-                            col = boundary + 1
-                    else:
-                        col = len(headers) + 1
-
-                worksheet.update_cell(date_row, col, log_value)
-
-                if habit_name not in headers:
-                    worksheet.update_cell(1, col, habit_name)
-
-            if habit_name in st.session_state.todays_pending_habits:
-                st.session_state.todays_pending_habits.remove(habit_name)
-
-            st.session_state.needs_rerun = True
+                today = get_argentina_date()
+                cache = get_cache_dias()
+                dia, _ = cache.obtener(today, lambda: leer_dia(worksheet, today))
+                if dia.fila is None:
+                    raise ValueError(f"No está la fecha {texto_fecha(today)} en la hoja")
+
+                # Fila y columna salen del índice del día; un hábito nuevo reserva su
+                # columna en memoria para que otro nuevo no la vuelva a elegir
+                with cache.lock:
+                    col, es_nueva = dia.columna_para(habit_name, BOUNDARY_COLUMN)
+                    dia.marcar(habit_name, col, es_nueva)
+                get_escritor(worksheet).encolar(sesion_habitos(), habit_name, dia.fila, col, es_nueva)
 
         except Exception as e:
-            st.error(f"Error al registrar el hábito: {e}")
+            # Se muestra en el script de este mismo rerun
+            st.session_state.habitos_error = f"Error al registrar el hábito: {e}"
+
+    @st.fragment(run_every=1)
+    def esperar_escritura(worksheet):
+        # Mientras haya escrituras propias en vuelo. Rerun si alguna falla (para restaurar y
+        # avisar) o cuando ya no queda nada: la página se dibuja sin el fragment y deja de correr
+        escritor, sesion = get_escritor(worksheet), sesion_habitos()
+        if escritor.hay_fallas(sesion) or not escritor.en_curso(sesion):
+            st.rerun()
+
+    # -------------------------------------------------------------------
+    # HISTORIAL (una lectura masiva, después solo los días nuevos)
+    # -------------------------------------------------------------------
+    @st.cache_resource
+    def get_cache_historial():
+        return CacheHistorial()
+
+    def cargar_historial(worksheet, dia):
+        """HistorialHabitos desde la fila 2 hasta hoy. Solo lee la hoja para días que todavía no están en memoria."""
+        cache = get_cache_historial()
+        _, hasta_fila = cache.copia()
+        ayer_fila = dia.fila - 1
+        if hasta_fila < ayer_fila:
+            if hasta_fila <= 1:
+                with perfilado.llamada_externa("gspread.get_all_values"):
+                    filas = worksheet.get_all_values()[1:ayer_fila]
+            else:
+                ultima_col = indice_a_col(max(1, len(dia.encabezados)))
+                with perfilado.llamada_externa("gspread.get"):
+                    filas = worksheet.get(f"A{hasta_fila + 1}:{ultima_col}{ayer_fila}")
+            filas = list(filas) + [[]] * (ayer_fila - hasta_fila - len(filas))
+            ancho = max([len(dia.encabezados)] + [len(f) for f in filas])
+            cache.agregar(matriz_hechos(filas, ancho), hasta_fila, ayer_fila)
+        perfilado.contar_cache("habitos.historial", hit=hasta_fila >= ayer_fila)
+
+        bruto, _ = cache.copia()
+        # La fila de hoy sale del estado diario (más lo que se está mandando)
+        hechos_hoy = dia.hechos | get_escritor(worksheet).nombres_sin_confirmar()
+        habitos = [(h["name"], h["group"]) for h in st.session_state.all_habits]
+        desde = dia.fecha - timedelta(days=dia.fila - 2)
+        return armar_historial(bruto, desde, dia.columnas, hechos_hoy, habitos)
+
+    def mostrar_historial(worksheet):
+        if worksheet is None:
+            return
+        dia, _ = get_cache_dias().obtener(get_argentina_date(), lambda: leer_dia(worksheet, get_argentina_date()))
+        if dia.fila is None:
+            st.info("La fecha de hoy no está en la hoja.")
+            return
+        historial = cargar_historial(worksheet, dia)
+
+        multa_dia = multas(historial)
+        c1, c2 = st.columns(2)
+        c1.metric("Multa acumulada (sin hoy)", f"${int(multa_dia[:-1].sum())}")
+        c2.metric("Últimos 30 días", f"${int(multa_dia[-31:-1].sum())}")
+
+        actual, mejor = rachas(historial.hechos)
+        ultimos = slice(max(0, historial.dias - 30), historial.dias)
+        activos = historial.activo[ultimos].sum(axis=0)
+        hechos = (historial.hechos & historial.activo)[ultimos].sum(axis=0)
+        st.dataframe(
+            {
+                "Hábito": list(historial.habitos),
+                "Grupo": [GRUPOS.get(int(g), "") for g in historial.grupos],
+                "Racha": actual.tolist(),
+                "Mejor racha": mejor.tolist(),
+                "30 días": [float(h / a) if a else None for h, a in zip(hechos, activos)],
+            },
+            column_config={"30 días": st.column_config.ProgressColumn("30 días", min_value=0, max_value=1, format="percent")},
+            hide_index=True,
+            use_container_width=True,
+        )
+
+        lunes, tasas = tasas_semanales(historial)
+        datos_semanas = {"Semana": [l.strftime("%d/%m") for l in lunes]}
+        for k, nombre in enumerate(GRUPOS.values()):
+            datos_semanas[nombre] = [None if np.isnan(t) else float(t) for t in tasas[:, k]]
+        st.dataframe(
+            datos_semanas,
+            column_config={
+                nombre: st.column_config.ProgressColumn(nombre, min_value=0, max_value=1, format="percent")
+                for nombre in GRUPOS.values()
+            },
+            hide_index=True,
+            use_container_width=True,
+        )
 
     # -------------------------------------------------------------------
     # UI PRINCIPAL
     # -------------------------------------------------------------------
     st.title("📅 Hábitos Básicos")
 
-    sheet = connect_to_google_sheets()
+    if st.session_state.get("habitos_error"):
+        st.error(st.session_state.pop("habitos_error"))
+
+    sheet = perfilado.con_cache("gspread.conexion", connect_to_google_sheets)
+    perfilado.marcar("conexion")
+
+    if sheet is not None:
+        for nombres, error in get_escritor(sheet).tomar_fallas(sesion_habitos()):
+            st.toast(f"No se pudo registrar {', '.join(nombres)}: {error}", icon="⚠️")
 
     # Cargar hábitos desde secrets
     if 'habits' not in st.session_state:
@@ -174,15 +291,16 @@ def run():
         st.session_state.all_habits = st.secrets["habits"]
 
     setup_daily_state(sheet)
+    perfilado.marcar("estado_diario")
 
     # -------------------------
     #     GRUPOS DE HÁBITOS
     # -------------------------
     pending = st.session_state.get("todays_pending_habits", [])
 
-    # Cartel en rojo con el total pendiente * 3750
+    # Cartel en rojo con el total pendiente * MULTA_POR_HABITO
     faltantes = len(pending)
-    multa = faltantes * 3750
+    multa = faltantes * MULTA_POR_HABITO
 
     st.markdown(
         f"""
@@ -222,9 +340,20 @@ def run():
                     disabled=(habit_name == "Social")
                 )
 
-    if st.session_state.get("needs_rerun", False):
-        st.session_state.needs_rerun = False
-        st.rerun()
+    # El historial se calcula solo si se abre: la primera vez baja la grilla entera
+    if st.toggle("📈 Historial", key="habitos_ver_historial"):
+        try:
+            mostrar_historial(sheet)
+        except Exception as e:
+            st.error(f"Error al cargar el historial: {e}")
+        perfilado.marcar("historial")
+
+    if sheet is not None:
+        escritor = get_escritor(sheet)
+        if escritor.en_curso(sesion_habitos()) or escritor.hay_fallas(sesion_habitos()):
+            esperar_escritura(sheet)
+
+    perfilado.marcar("ui")
 
 if __name__ == "__main__":
     run()
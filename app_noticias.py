@@ -7,6 +7,7 @@ from datetime import datetime, timedelta, timezone
 from bs4 import BeautifulSoup
 from deep_translator import GoogleTranslator
 import time
+import perfilado
 
 # --- CONFIGURACIÓN DE NOTICIAS ---
 COUNTRIES = {
@@ -22,7 +23,9 @@ TOPICS = {
     "Tecnología": "TECHNOLOGY",
 }
 
-translator = GoogleTranslator(source="auto", target="es")
+@st.cache_resource
+def get_translator():
+    return GoogleTranslator(source="auto", target="es")
 
 # --- FUNCIONES DE INDEC (DRIVE) ---
 
@@ -35,7 +38,9 @@ def obtener_calendario_indec():
         timestamp = int(time.time())
         url = f"https://drive.google.com/uc?export=download&id={id_drive}&t={timestamp}"
         
-        response = requests.get(url, timeout=10)
+        perfilado.cache_miss("indec")
+        with perfilado.llamada_externa("drive.indec"):
+            response = requests.get(url, timeout=10)
         response.raise_for_status()
         return response.json()
     except Exception as e:
@@ -44,7 +49,7 @@ def obtener_calendario_indec():
 
 def mostrar_alerta_indec():
     """Muestra información si hoy hay publicaciones en INDEC."""
-    datos = obtener_calendario_indec()
+    datos = perfilado.con_cache("indec", obtener_calendario_indec)
     if not datos:
         return
 
@@ -78,12 +83,16 @@ def mostrar_alerta_indec():
 
 @st.cache_data(ttl=120)
 def fetch_feed(url: str):
-    return feedparser.parse(url)
+    perfilado.cache_miss("feed")
+    with perfilado.llamada_externa("feedparser.parse"):
+        return feedparser.parse(url)
 
 @st.cache_data(ttl=3600)
 def translate_to_spanish(text: str) -> str:
+    perfilado.cache_miss("traduccion")
     try:
-        return translator.translate(text)
+        with perfilado.llamada_externa("translator.translate"):
+            return get_translator().translate(text)
     except Exception:
         return text
 
@@ -99,11 +108,13 @@ def build_feed_url(country_key: str, query: str = "", topic: str | None = None)
 
 def resolve_url(url: str, timeout: int = 6) -> str:
     try:
-        r = requests.head(url, allow_redirects=True, timeout=timeout)
+        with perfilado.llamada_externa("resolve.head"):
+            r = requests.head(url, allow_redirects=True, timeout=timeout)
         return r.url
     except Exception:
         try:
-            r = requests.get(url, allow_redirects=True, timeout=timeout)
+            with perfilado.llamada_externa("resolve.get"):
+                r = requests.get(url, allow_redirects=True, timeout=timeout)
             return r.url
         except Exception:
             return url
@@ -114,6 +125,7 @@ def main():
 
     # 1. INDEC arriba de todo
     mostrar_alerta_indec()
+    perfilado.marcar("indec")
 
     # 2. BARRA LATERAL
     with st.sidebar:
@@ -127,10 +139,12 @@ def main():
         st.write("---")
         translate_titles = st.checkbox("Traducir títulos al español", False)
         resolve_links = st.checkbox("Resolver enlaces finales", True)
+    perfilado.marcar("sidebar")
 
     # 3. CARGA DE NOTICIAS
     feed_url = build_feed_url(country, query, topic_id)
-    parsed = fetch_feed(feed_url)
+    parsed = perfilado.con_cache("feed", fetch_feed, feed_url)
+    perfilado.marcar("feed")
 
     if parsed.bozo:
         st.error("No se pudo cargar el feed de noticias.")
@@ -150,7 +164,7 @@ def main():
         pub_date = entry.get("published", "")
 
         if translate_titles:
-            title_es = translate_to_spanish(title_orig)
+            title_es = perfilado.con_cache("traduccion", translate_to_spanish, title_orig)
             title_display = f"{title_es}\n\n*({title_orig})*"
         else:
             title_display = title_orig
@@ -163,5 +177,7 @@ def main():
         st.write(summary, unsafe_allow_html=True)
         st.divider()
 
+    perfilado.marcar("render")
+
 if __name__ == "__main__":
     main()
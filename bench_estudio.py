@@ -0,0 +1,237 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+import statistics
+from streamlit.testing.v1 import AppTest
+from sheets_stub_server import StubSheets
+from sheet_layout import indice_a_col
+from estudio_usuarios import USUARIOS_POR_DEFECTO, cargar_usuarios
+
+# ------------------ BENCHMARK DE INTERACCIONES DE ESTUDIO ------------------
+# Levanta el stand-in local de Sheets, corre app_estudio con AppTest y mide,
+# para cada interacción (carga, recarga, iniciar, detener, corrección), el
+# tiempo de pared y cuántas llamadas a Sheets provocó. Con --usuarios se repite
+# todo con configs sintéticas de N usuarios (los dos reales + generados), un
+# proceso por cantidad: la config de usuarios es fija por proceso, como en producción.
+#
+#   python bench_estudio.py --latency 150 --json bench.json
+#   python bench_estudio.py --baseline bench.json   # falla si hay regresión
+#   python bench_estudio.py --usuarios 2,10,50
+
+SHEET_ID = "bench"
+INTERACCIONES = ("carga_inicial", "recarga", "iniciar", "detener", "correccion")
+
+
+def _service_account(token_uri):
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ).decode()
+    return json.dumps({
+        "type": "service_account", "project_id": "bench", "private_key_id": "bench",
+        "private_key": pem, "client_email": "bench@bench.iam.gserviceaccount.com",
+        "client_id": "0", "token_uri": token_uri,
+    })
+
+
+def _pagina():
+    import streamlit as st
+    st.session_state.setdefault("usuario_seleccionado", "Facundo")
+    import app_estudio
+    app_estudio.main()
+
+
+def config_usuarios(n):
+    """Los usuarios por defecto más n-2 generados, cada uno con su hoja y sus celdas en 'marcas'."""
+    spec = [dict(u) for u in USUARIOS_POR_DEFECTO[:n]]
+    for i in range(len(spec), n):
+        col = indice_a_col(30 + i)  # una columna de 'marcas' por usuario: lock y estados
+        marcas = [indice_a_col(100 + 4 * i + k) for k in range(4)]
+        spec.append({
+            "nombre": f"Usuario {i}",
+            "hoja": f"Hoja {i}",
+            "fila_base": 5,
+            "lock": f"{col}1",
+            "materias": [[f"Materia {j}", indice_a_col(2 + j), f"{col}{2 + j}", False] for j in range(3)],
+            "marcas": dict(zip(("rate", "obj", "check", "pozo"), marcas)),
+            "md": "",
+        })
+    return spec
+
+
+def sembrar(stub, usuario, spec):
+    import app_estudio
+    cfg = app_estudio.get_day_config(usuarios=cargar_usuarios(spec))
+    for u in cfg.users:
+        stub.grilla.set(cfg.rate[u], "10")
+        stub.grilla.set(cfg.obj[u], "240")
+        stub.grilla.set(cfg.pozo[u], "0")
+    stub.grilla.set(cfg.week, "0")
+    for i, info in enumerate(cfg.users[usuario].values()):
+        stub.grilla.set(info.time, f"00:{10 + i:02d}:00")
+
+
+def esperar_journal(timeout=30):
+    import app_estudio
+    journal = app_estudio.get_journal()
+    limite = time.time() + timeout
+    while journal.cantidad_pendientes() and time.time() < limite:
+        time.sleep(0.01)
+
+
+def medir(stub, resultados, nombre, accion):
+    stub.reset_conteo()
+    t0 = time.perf_counter()
+    at = accion()
+    wall = time.perf_counter() - t0
+    esperar_journal()
+    conteo = stub.conteo()
+    if at is not None and at.exception:
+        raise RuntimeError(f"{nombre}: {at.exception[0].value}")
+    resultados.setdefault(nombre, []).append({
+        "wall_s": wall,
+        "batchGet": conteo.get("batchGet", 0),
+        "batchUpdate": conteo.get("batchUpdate", 0),
+        "append": conteo.get("append", 0),
+    })
+
+
+def _boton(at, prefijo):
+    return next(b for b in at.button if b.label.startswith(prefijo))
+
+
+def nueva_sesion(stub, usuario, spec):
+    at = AppTest.from_function(_pagina, default_timeout=60)
+    at.secrets["sheet_id"] = SHEET_ID
+    at.secrets["service_account"] = stub.service_account
+    at.secrets["sheets_api_url"] = stub.api_url
+    at.secrets["journal_path"] = stub.journal_path
+    at.secrets["facundo_md"] = at.secrets["ivan_md"] = ""
+    at.secrets["usuarios"] = spec
+    # Sin vueltas periódicas durante la medición: solo las que piden las escrituras
+    at.secrets["sondeo_segundos"] = 600
+    at.session_state["usuario_seleccionado"] = usuario
+    # Mismo holder en todas las sesiones, así el lease tomado en la primera corrida sigue siendo propio
+    at.session_state["lease_holder"] = "bench"
+    return at
+
+
+def correr(stub, usuario, repeticiones, spec):
+    # Primera corrida sin medir: importa app_estudio y obtiene el token
+    nueva_sesion(stub, usuario, spec).run()
+    import app_estudio
+    sembrar(stub, usuario, spec)
+    # Que el sondeador publique lo sembrado antes de medir
+    sondeador = app_estudio.get_sondeador()
+    version = sondeador.version
+    sondeador.despertar()
+    sondeador.esperar(version + 1)
+
+    resultados = {}
+    for _ in range(repeticiones):
+        at = nueva_sesion(stub, usuario, spec)
+
+        medir(stub, resultados, "carga_inicial", at.run)
+        medir(stub, resultados, "recarga", at.run)
+        medir(stub, resultados, "iniciar", lambda: _boton(at, "▶ INICIAR").click().run())
+        medir(stub, resultados, "detener", lambda: _boton(at, "⛔").click().run())
+
+        materia = next(iter(app_estudio.get_day_config(usuarios=cargar_usuarios(spec)).users[usuario]))
+        at.text_input(key=f"input_{app_estudio.sanitize_key(materia)}").set_value("01:02:03")
+        medir(stub, resultados, "correccion", lambda: _boton(at, "Guardar Corrección").click().run())
+    return resultados
+
+
+def resumir(resultados):
+    resumen = {}
+    for nombre in INTERACCIONES:
+        muestras = resultados.get(nombre, [])
+        if not muestras:
+            continue
+        resumen[nombre] = {
+            "wall_ms_mediana": statistics.median(m["wall_s"] for m in muestras) * 1000,
+            "batchGet": max(m["batchGet"] for m in muestras),
+            "batchUpdate": max(m["batchUpdate"] for m in muestras),
+            "append": max(m["append"] for m in muestras),
+        }
+    return resumen
+
+
+def comparar(resumen, baseline, tolerancia):
+    """Lista de regresiones: más llamadas que la línea base, o más lento que la tolerancia."""
+    regresiones = []
+    for nombre, actual in resumen.items():
+        base = baseline.get(nombre)
+        if base is None:
+            continue
+        for op in ("batchGet", "batchUpdate", "append"):
+            if actual.get(op, 0) > base.get(op, 0):
+                regresiones.append(f"{nombre}: {op} {base[op]} -> {actual[op]}")
+        if actual["wall_ms_mediana"] > base["wall_ms_mediana"] * (1 + tolerancia):
+            regresiones.append(f"{nombre}: {base['wall_ms_mediana']:.0f} ms -> {actual['wall_ms_mediana']:.0f} ms")
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de interacciones de app_estudio contra un stub local de Sheets")
+    parser.add_argument("--latency", type=float, default=100, help="latencia inyectada por llamada, en ms")
+    parser.add_argument("--usuario", default="Facundo")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--usuarios", help="cantidades de usuarios a medir, ej. 2,10,50 (por defecto, la config real)")
+    parser.add_argument("--json", help="guardar el resumen en este archivo")
+    parser.add_argument("--baseline", help="resumen previo contra el cual comparar")
+    parser.add_argument("--tolerancia", type=float, default=0.5, help="margen de tiempo aceptado sobre la línea base")
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    stub = StubSheets(args.latency).iniciar()
+    tmp = tempfile.mkdtemp(prefix="bench_estudio_")
+    stub.service_account = _service_account(stub.token_uri)
+    stub.journal_path = os.path.join(tmp, "journal.sqlite3")
+    cantidades = [int(n) for n in args.usuarios.split(",")] if args.usuarios else [len(USUARIOS_POR_DEFECTO)]
+    por_cantidad = {}
+    try:
+        if len(cantidades) == 1:
+            por_cantidad[cantidades[0]] = resumir(correr(stub, args.usuario, args.repeticiones, config_usuarios(cantidades[0])))
+        else:
+            for n in cantidades:
+                salida = os.path.join(tmp, f"usuarios_{n}.json")
+                subprocess.run([sys.executable, os.path.abspath(__file__), "--latency", str(args.latency),
+                                "--usuario", args.usuario, "--repeticiones", str(args.repeticiones),
+                                "--usuarios", str(n), "--json", salida],
+                               check=True, stdout=subprocess.DEVNULL)
+                with open(salida, encoding="utf-8") as f:
+                    por_cantidad[n] = json.load(f)
+    finally:
+        stub.detener()
+
+    for n, resumen in por_cantidad.items():
+        if len(por_cantidad) > 1:
+            print(f"\n{n} usuarios")
+        print(f"{'interacción':<15}{'wall (ms)':>12}{'batchGet':>10}{'batchUpdate':>13}{'append':>8}")
+        for nombre, r in resumen.items():
+            print(f"{nombre:<15}{r['wall_ms_mediana']:>12.1f}{r['batchGet']:>10}{r['batchUpdate']:>13}{r.get('append', 0):>8}")
+    # La línea base y el --json son de la primera cantidad pedida
+    resumen = por_cantidad[cantidades[0]]
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(resumen, f, indent=2, ensure_ascii=False)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regresiones = comparar(resumen, json.load(f), args.tolerancia)
+        for r in regresiones:
+            print(f"REGRESIÓN {r}")
+        if regresiones:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
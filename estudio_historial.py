@@ -0,0 +1,79 @@
+from datetime import timedelta
+import numpy as np
+from sheet_layout import col_a_indice, indice_a_col, format_a1
+from sheets_decode import columnas, columna_segundos
+
+# ------------------ HISTORIAL MULTI-DÍA ------------------
+# Una ventana de días para todas las materias de todos los usuarios se pide
+# en un único batchGet: un rango rectangular por hoja de usuario. Cada
+# respuesta se decodifica en una matriz (días x materias) de segundos.
+
+VENTANAS = ("semana", "mes", "todo")
+
+
+def ventana(nombre, hoy, fecha_base):
+    """(desde, hasta) inclusivos para 'semana', 'mes' o 'todo'."""
+    if nombre == "semana":
+        desde = hoy - timedelta(days=hoy.weekday())
+    elif nombre == "mes":
+        desde = hoy.replace(day=1)
+    elif nombre == "todo":
+        desde = fecha_base
+    else:
+        raise ValueError(f"Ventana desconocida: {nombre}")
+    return max(desde, fecha_base), hoy
+
+
+class HistorialEstudio:
+    """Segundos por día y materia. `segundos[usuario]` tiene forma (dias, materias)."""
+    __slots__ = ("desde", "dias", "materias", "segundos")
+
+    def __init__(self, desde, dias, materias, segundos):
+        self.desde = desde
+        self.dias = dias
+        self.materias = materias
+        self.segundos = segundos
+
+    @property
+    def fechas(self):
+        return [self.desde + timedelta(days=i) for i in range(self.dias)]
+
+    def serie(self, usuario, materia):
+        return self.segundos[usuario][:, self.materias[usuario].index(materia)]
+
+    def total_por_dia(self, usuario, incluir=None):
+        """Suma por día; `incluir` limita a esas materias (por defecto, todas)."""
+        matriz = self.segundos[usuario]
+        if incluir is None:
+            return matriz.sum(axis=1)
+        cols = [i for i, m in enumerate(self.materias[usuario]) if m in incluir]
+        return matriz[:, cols].sum(axis=1)
+
+
+def rangos_historial(materias_spec, fecha_base, desde, hasta):
+    """Un rango rectangular por usuario. `materias_spec` es {usuario: (hoja, fila_base, [(materia, col, ...), ...])}."""
+    rangos = {}
+    for user, (hoja, fila_base, materias) in materias_spec.items():
+        idx = [col_a_indice(col) for _, col, *_ in materias]
+        fila_desde = fila_base + (desde - fecha_base).days
+        fila_hasta = fila_base + (hasta - fecha_base).days
+        rangos[user] = format_a1(hoja, indice_a_col(min(idx)), fila_desde, indice_a_col(max(idx)), fila_hasta)
+    return rangos
+
+
+def decodificar_historial(materias_spec, desde, hasta, value_ranges):
+    """Arma el HistorialEstudio a partir de los valueRanges en el orden de `materias_spec`."""
+    dias = (hasta - desde).days + 1
+    nombres = {}
+    segundos = {}
+    for (user, (_, _, materias)), vr in zip(materias_spec.items(), value_ranges):
+        idx = [col_a_indice(col) for _, col, *_ in materias]
+        offsets = [i - min(idx) for i in idx]
+        # La API omite las filas vacías del final y las celdas vacías al final de cada fila
+        cols = columnas(vr.get("values", []), dias, max(offsets) + 1)
+        matriz = np.empty((dias, len(materias)), dtype=np.int32)
+        for j, off in enumerate(offsets):
+            matriz[:, j] = columna_segundos(cols[off])
+        nombres[user] = tuple(m for m, *_ in materias)
+        segundos[user] = matriz
+    return HistorialEstudio(desde, dias, nombres, segundos)
@@ -0,0 +1,145 @@
+import json
+import time
+import sqlite3
+import threading
+
+# ------------------ JOURNAL LOCAL DE ESCRITURAS ------------------
+# Cada start/stop/corrección se guarda primero en un SQLite local y la UI
+# confirma al instante. Un hilo en segundo plano junta los eventos pendientes
+# en un solo batchUpdate y reintenta con backoff si Google no responde.
+# Las filas para agregar al final de una hoja (registro de sesiones) viajan en el
+# mismo evento y salen antes, en un solo values:append. Lo enviado se borra: la
+# tabla solo guarda pendientes y leerlos no depende de cuánto se usó la app.
+
+BACKOFF_INICIAL = 1.0
+BACKOFF_MAXIMO = 60.0
+
+class Journal:
+    def __init__(self, path, enviar, al_enviar=None, anexar=None):
+        """`enviar(updates)` escribe en la hoja; `anexar(filas)` agrega filas al registro;
+        `al_enviar(updates)` se llama tras cada envío exitoso."""
+        self.path = path
+        self.enviar = enviar
+        self.anexar = anexar
+        self.al_enviar = al_enviar
+        self.lock = threading.Lock()
+        self.hay_trabajo = threading.Event()
+        self.ultimo_error = None
+        self._hilo = None
+        with self._conectar() as con:
+            con.execute("PRAGMA journal_mode=WAL")
+            # `enviado` es de una versión anterior que marcaba lo enviado en vez de
+            # borrarlo: ya no se escribe ni se filtra por ella, solo se conserva para
+            # abrir journals viejos. Todo evento de la tabla está pendiente.
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS eventos ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " creado REAL NOT NULL,"
+                " tipo TEXT NOT NULL,"
+                " updates TEXT NOT NULL,"
+                " enviado INTEGER NOT NULL DEFAULT 0)"
+            )
+            columnas = [c[1] for c in con.execute("PRAGMA table_info(eventos)")]
+            if "filas" not in columnas:
+                con.execute("ALTER TABLE eventos ADD COLUMN filas TEXT NOT NULL DEFAULT '[]'")
+            # Migración: lo que esos journals marcaron como enviado se borra
+            con.execute("DELETE FROM eventos WHERE enviado = 1")
+
+    def _conectar(self):
+        return sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+
+    def registrar(self, tipo, updates, filas=()):
+        with self.lock, self._conectar() as con:
+            con.execute(
+                "INSERT INTO eventos (creado, tipo, updates, filas) VALUES (?, ?, ?, ?)",
+                (time.time(), tipo, json.dumps([list(u) for u in updates]), json.dumps([list(f) for f in filas])),
+            )
+        self.hay_trabajo.set()
+
+    def _pendientes(self):
+        with self.lock, self._conectar() as con:
+            filas = con.execute(
+                "SELECT id, updates, filas FROM eventos ORDER BY id"
+            ).fetchall()
+        return [(i, json.loads(u), json.loads(f)) for i, u, f in filas]
+
+    def celdas_pendientes(self):
+        """Valor más reciente de cada celda que todavía no llegó a la hoja."""
+        celdas = {}
+        for _, updates, _ in self._pendientes():
+            for r, v in updates:
+                celdas[r] = v
+        return celdas
+
+    def filas_pendientes(self):
+        """Filas del registro que todavía no se agregaron a la hoja, en orden."""
+        return [f for _, _, filas in self._pendientes() for f in filas]
+
+    def cantidad_pendientes(self):
+        with self.lock, self._conectar() as con:
+            return con.execute("SELECT COUNT(*) FROM eventos").fetchone()[0]
+
+    def flush(self):
+        """Envía todos los pendientes: filas en un append y celdas en un batchUpdate.
+
+        Devuelve True si no quedó nada.
+        """
+        pendientes = self._pendientes()
+        if not pendientes:
+            return True
+        # Primero las filas del registro, todas en un append. Una vez agregadas se
+        # borran del evento, así un fallo en el batchUpdate no las duplica. Si el
+        # append falla las filas quedan para el próximo intento, pero las celdas
+        # salen igual: el resto de la hoja no espera al registro.
+        error_filas = None
+        con_filas = [i for i, _, fs in pendientes if fs]
+        filas = [f for _, _, fs in pendientes for f in fs]
+        if filas:
+            try:
+                self.anexar(filas)
+            except Exception as e:
+                error_filas = str(e)
+            else:
+                with self.lock, self._conectar() as con:
+                    con.executemany("UPDATE eventos SET filas = '[]' WHERE id = ?", [(i,) for i in con_filas])
+                con_filas = []
+        # Las celdas guardan totales, así que gana la última escritura de cada rango
+        coalescidos = {}
+        for _, updates, _ in pendientes:
+            for r, v in updates:
+                coalescidos.pop(r, None)
+                coalescidos[r] = v
+        updates = list(coalescidos.items())
+        if updates:
+            try:
+                self.enviar(updates)
+            except Exception as e:
+                self.ultimo_error = str(e)
+                return False
+        # Lo enviado se borra; de un evento con filas sin agregar quedan solo las filas
+        with self.lock, self._conectar() as con:
+            con.executemany("DELETE FROM eventos WHERE id = ?",
+                            [(i,) for i, _, _ in pendientes if i not in con_filas])
+            con.executemany("UPDATE eventos SET updates = '[]' WHERE id = ?", [(i,) for i in con_filas])
+        self.ultimo_error = error_filas
+        if self.al_enviar is not None:
+            self.al_enviar(updates)
+        return error_filas is None
+
+    def _loop(self):
+        espera = BACKOFF_INICIAL
+        while True:
+            self.hay_trabajo.wait()
+            self.hay_trabajo.clear()
+            while not self.flush():
+                time.sleep(espera)
+                espera = min(espera * 2, BACKOFF_MAXIMO)
+            espera = BACKOFF_INICIAL
+
+    def iniciar(self):
+        if self._hilo is None:
+            self._hilo = threading.Thread(target=self._loop, name="journal-estudio", daemon=True)
+            self._hilo.start()
+            # Lo que haya quedado sin enviar de una ejecución anterior
+            self.hay_trabajo.set()
+        return self
@@ -0,0 +1,110 @@
+import uuid
+import threading
+from datetime import datetime, timedelta, time as dt_time
+from sheet_layout import format_a1
+from sheets_decode import numero, texto
+
+# ------------------ REGISTRO DE SESIONES (SOLO AGREGAR) ------------------
+# Cada sesión de estudio es una fila nueva en la hoja 'sesiones', escrita con
+# values:append: nunca se lee ni se pisa un total para sumarle segundos. El
+# total de un día por materia es la suma de sus filas. Las celdas HH:MM:SS de
+# cada usuario quedan como vista materializada de esa suma (las usan las
+# fórmulas de 'marcas') y se corrigen solas si alguna vez no coinciden.
+#
+# Columnas: usuario | materia | inicio | fin | segundos | fecha | tipo | id
+# (la fila 1 puede tener esos nombres como encabezado; se ignora al sumar).
+# Las filas se escriben RAW, así fecha e id quedan como texto. `id` es único por
+# fila: si un append se reintenta y llega dos veces, se cuenta una.
+
+SHEET_SESIONES = "sesiones"
+FILA_DATOS = 1
+COLUMNAS = ("usuario", "materia", "inicio", "fin", "segundos", "fecha", "tipo", "id")
+ULTIMA_COL = "H"
+RANGO_APPEND = f"'{SHEET_SESIONES}'!A:{ULTIMA_COL}"
+
+TIPO_SESION = "sesion"
+TIPO_AJUSTE = "ajuste"
+TIPO_LEGADO = "legado"
+
+
+def _fila(usuario, materia, inicio, fin, segs, fecha, tipo, id_fila=None):
+    return [usuario, materia, inicio, fin, int(segs), fecha.strftime("%Y-%m-%d"), tipo, id_fila or uuid.uuid4().hex]
+
+
+def filas_sesion(usuario, materia, inicio, fin):
+    """Una fila por día tocado: si la sesión cruzó la medianoche, cada parte cuenta en su día."""
+    filas = []
+    desde = inicio
+    while desde < fin:
+        medianoche = datetime.combine(desde.date() + timedelta(days=1), dt_time(0, 0)).replace(tzinfo=desde.tzinfo)
+        hasta = min(fin, medianoche)
+        segs = int((hasta - desde).total_seconds())
+        filas.append(_fila(usuario, materia, desde.isoformat(sep=" ", timespec="seconds"),
+                           hasta.isoformat(sep=" ", timespec="seconds"), segs, desde.date(), TIPO_SESION))
+        desde = hasta
+    return filas
+
+
+def fila_ajuste(usuario, materia, fecha, segs, ahora):
+    """Corrección manual: suma (o resta) la diferencia contra el total actual."""
+    marca = ahora.isoformat(sep=" ", timespec="seconds")
+    return _fila(usuario, materia, marca, marca, segs, fecha, TIPO_AJUSTE)
+
+
+def fila_legado(usuario, materia, fecha, segs):
+    """Lo que ya tenía la celda HH:MM:SS antes de que el día pasara al registro.
+
+    El id es fijo por (usuario, materia, día): si dos dispositivos lo agregan a la vez, cuenta una vez.
+    """
+    return _fila(usuario, materia, "", "", segs, fecha, TIPO_LEGADO,
+                 f"{TIPO_LEGADO}:{usuario}:{materia}:{fecha.strftime('%Y-%m-%d')}")
+
+
+class RegistroSesiones:
+    """Totales por (usuario, materia, 'YYYY-MM-DD') del registro, leído de a pedazos (solo lo nuevo)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.filas_leidas = 0
+        self.ids = set()
+        self.totales = {}
+        self.cargado = False
+        self.ultimo_error = None
+
+    def rango_pendiente(self):
+        with self.lock:
+            return format_a1(SHEET_SESIONES, "A", FILA_DATOS + self.filas_leidas) + f":{ULTIMA_COL}"
+
+    def _sumar(self, fila, totales, ids):
+        fila = list(fila) + [""] * (len(COLUMNAS) - len(fila))
+        usuario, materia, fecha, id_fila = texto(fila[0]), texto(fila[1]), texto(fila[5]), texto(fila[7])
+        if not usuario or not fecha or (id_fila and id_fila in ids) or fila[:len(COLUMNAS)] == list(COLUMNAS):
+            return
+        if id_fila:
+            ids.add(id_fila)
+        clave = (usuario, materia, fecha)
+        totales[clave] = totales.get(clave, 0) + int(numero(fila[4]))
+
+    def agregar(self, values):
+        """Suma las filas nuevas de un valueRange pedido con `rango_pendiente()`."""
+        with self.lock:
+            for fila in values:
+                self.filas_leidas += 1
+                self._sumar(fila, self.totales, self.ids)
+            self.cargado = True
+
+    def disponible(self):
+        """True si los totales están al día: se leyó el registro y la última lectura no falló."""
+        return self.cargado and not self.ultimo_error
+
+    def totales_con(self, pendientes=()):
+        """Copia de los totales sumando filas todavía no enviadas (sin contar dos veces un mismo id)."""
+        with self.lock:
+            totales, ids = dict(self.totales), set(self.ids)
+        for fila in pendientes:
+            self._sumar(fila, totales, ids)
+        return totales
+
+
+def clave_dia(usuario, materia, fecha):
+    return usuario, materia, fecha.strftime("%Y-%m-%d")
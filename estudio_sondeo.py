@@ -0,0 +1,77 @@
+import time
+import threading
+
+# ------------------ SONDEO COMPARTIDO DE LA HOJA ------------------
+# Un solo hilo por proceso lee la hoja cada `intervalo` segundos y publica el
+# resultado con un número de versión. Las sesiones solo leen lo publicado: abrir
+# más pestañas no suma lecturas. Los pedidos de refresco (navegación, escrituras
+# que ya llegaron a la hoja) se juntan y respetan un mínimo entre lecturas.
+
+INTERVALO = 20.0
+INTERVALO_MINIMO = 2.0
+BACKOFF_MAXIMO = 120.0
+
+class Sondeador:
+    def __init__(self, leer, intervalo=INTERVALO, intervalo_minimo=INTERVALO_MINIMO):
+        """`leer()` trae la hoja y publica lo leído; si lanza una excepción se reintenta con backoff."""
+        self.leer = leer
+        self.intervalo = intervalo
+        self.intervalo_minimo = intervalo_minimo
+        self.cond = threading.Condition()
+        self.version = 0
+        self.actualizado = None
+        self.ultimo_error = None
+        self.lecturas = 0
+        self._pedido = False
+        self._hilo = None
+
+    def despertar(self):
+        """Pide una lectura antes de la próxima vuelta. Varios pedidos seguidos cuentan como uno."""
+        with self.cond:
+            self._pedido = True
+            self.cond.notify_all()
+
+    def esperar(self, version_minima=1, timeout=30.0):
+        """Bloquea hasta que haya una publicación >= `version_minima`. Devuelve True si la hubo."""
+        limite = time.monotonic() + timeout
+        with self.cond:
+            while self.version < version_minima:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    return False
+                self.cond.wait(restante)
+            return True
+
+    def _vuelta(self):
+        try:
+            self.leer()
+        except Exception as e:
+            with self.cond:
+                self.ultimo_error = str(e)
+            return False
+        with self.cond:
+            self.lecturas += 1
+            self.version += 1
+            self.actualizado = time.time()
+            self.ultimo_error = None
+            self.cond.notify_all()
+        return True
+
+    def _loop(self):
+        espera = self.intervalo
+        while True:
+            inicio = time.monotonic()
+            ok = self._vuelta()
+            espera = self.intervalo if ok else min(max(espera, self.intervalo_minimo) * 2, BACKOFF_MAXIMO)
+            # El mínimo entre lecturas vale también para los pedidos de refresco
+            time.sleep(max(0.0, self.intervalo_minimo - (time.monotonic() - inicio)))
+            with self.cond:
+                if not self._pedido:
+                    self.cond.wait_for(lambda: self._pedido, espera - self.intervalo_minimo)
+                self._pedido = False
+
+    def iniciar(self):
+        if self._hilo is None:
+            self._hilo = threading.Thread(target=self._loop, name="sondeo-estudio", daemon=True)
+            self._hilo.start()
+        return self
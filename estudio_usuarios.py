@@ -0,0 +1,158 @@
+import json
+import functools
+from types import MappingProxyType
+from collections.abc import Mapping
+import streamlit as st
+from sheet_layout import _Inmutable
+
+# ------------------ USUARIOS DESDE CONFIGURACIÓN ------------------
+# Cada usuario trae su hoja, fila base, materias, columnas en 'marcas', celda de
+# lock y fórmula de balance. Se leen de st.secrets["usuarios"] (lista de tablas
+# TOML, mismas claves que USUARIOS_POR_DEFECTO); sin esa clave se usan los de
+# siempre. Sumar a alguien es editar la config, no el código.
+#
+#   [[usuarios]]
+#   nombre = "Facundo"
+#   hoja = "F. Economía"
+#   fila_base = 10
+#   lock = "Z3"
+#   materias = [["Trabajo", "B", "Z10", true], ["Cursado", "C", "Z14", false]]
+#   marcas = { rate = "C", obj = "P", check = "I", pozo = "X" }
+#   balance = { signo = -1, suma = 1, offset = 0 }
+#   admin = true
+#   dinero_detallado = true
+#   md = "facundo_md"
+
+USUARIOS_POR_DEFECTO = [
+    {
+        "nombre": "Facundo",
+        "hoja": "F. Economía",
+        "fila_base": 10,
+        "lock": "Z3",
+        "materias": [
+            ["Trabajo",           "B", "Z10", True],
+            ["Cursado",           "C", "Z14", False],
+            ["Estadística I",     "D", "Z4",  False],
+            ["Int. Contabilidad", "E", "Z5",  False],
+            ["Sociología",        "F", "Z6",  False],
+            ["Derecho Público",   "G", "Z7",  False],
+        ],
+        "marcas": {"rate": "C", "obj": "P", "check": "I", "pozo": "X"},
+        "balance": {"signo": -1.0, "suma": 1.0, "offset": 0.0},
+        "admin": True,
+        "dinero_detallado": True,
+        "md": "facundo_md",
+    },
+    {
+        "nombre": "Iván",
+        "hoja": "I. Física",
+        "fila_base": 5,
+        "lock": "Z2",
+        "materias": [
+            ["Física",   "B", "Z8",  False],
+            ["Análisis", "C", "Z9",  False],
+            ["Álgebra",  "D", "Z13", False],
+        ],
+        "marcas": {"rate": "B", "obj": "O", "check": "H", "pozo": "W"},
+        "balance": {"signo": 1.0, "suma": 0.0, "offset": -15000.0},
+        "admin": False,
+        "dinero_detallado": False,
+        "md": "ivan_md",
+    },
+]
+
+CAMPOS_MARCAS = ("rate", "obj", "check", "pozo")
+
+
+class Usuario(_Inmutable):
+    """`materias` es una tupla de (nombre, columna de tiempo, celda de estado en marcas, excluir)."""
+    __slots__ = ("nombre", "hoja", "fila_base", "lock", "materias", "marcas", "balance",
+                 "admin", "dinero_detallado", "md")
+
+    def __init__(self, nombre, hoja, fila_base, lock, materias, marcas, balance=None,
+                 admin=False, dinero_detallado=False, md=None):
+        faltan = [c for c in CAMPOS_MARCAS if c not in marcas]
+        if faltan:
+            raise ValueError(f"Usuario {nombre}: faltan columnas de marcas {faltan}")
+        balance = dict(balance or {})
+        self._set(
+            nombre=nombre, hoja=hoja, fila_base=int(fila_base), lock=lock,
+            materias=tuple((m, col.upper(), est.upper(), bool(excluir)) for m, col, est, excluir in materias),
+            marcas=MappingProxyType({c: marcas[c].upper() for c in CAMPOS_MARCAS}),
+            balance=MappingProxyType({
+                "signo": float(balance.get("signo", 1.0)),
+                "suma": float(balance.get("suma", 0.0)),
+                "offset": float(balance.get("offset", 0.0)),
+            }),
+            admin=bool(admin), dinero_detallado=bool(dinero_detallado), md=md,
+        )
+
+    def __repr__(self):
+        return f"Usuario({self.nombre!r})"
+
+
+class Usuarios(Mapping):
+    """{nombre: Usuario} de solo lectura. Se hashea por identidad para servir de clave de caché."""
+    __slots__ = ("_por_nombre",)
+
+    def __init__(self, usuarios):
+        self._por_nombre = dict(usuarios)
+
+    def __getitem__(self, nombre):
+        return self._por_nombre[nombre]
+
+    def __iter__(self):
+        return iter(self._por_nombre)
+
+    def __len__(self):
+        return len(self._por_nombre)
+
+    __eq__ = object.__eq__
+    __hash__ = object.__hash__
+
+    def __repr__(self):
+        return f"Usuarios({list(self._por_nombre)!r})"
+
+
+def _plano(v):
+    """AttrDict/listas de st.secrets -> dicts y listas comunes (para serializar)."""
+    if isinstance(v, Mapping):
+        return {k: _plano(x) for k, x in v.items()}
+    if isinstance(v, (list, tuple)):
+        return [_plano(x) for x in v]
+    return v
+
+
+@functools.lru_cache(maxsize=8)
+def _desde_json(spec_json):
+    usuarios = {}
+    for d in json.loads(spec_json):
+        u = Usuario(**d)
+        if u.nombre in usuarios:
+            raise ValueError(f"Usuario repetido en la config: {u.nombre}")
+        usuarios[u.nombre] = u
+    if not usuarios:
+        raise ValueError("La config de usuarios está vacía")
+    return Usuarios(usuarios)
+
+
+def cargar_usuarios(spec=None):
+    """Usuarios en el orden de la config. Memoizado: la misma config devuelve el mismo objeto."""
+    return _desde_json(json.dumps(_plano(spec if spec is not None else USUARIOS_POR_DEFECTO), sort_keys=True))
+
+
+def usuarios_configurados():
+    return cargar_usuarios(st.secrets.get("usuarios"))
+
+
+def usuario_por_defecto(usuarios, admin):
+    """Primer usuario admin (entrada con password) o primer usuario común."""
+    candidatos = [u for u in usuarios.values() if u.admin == admin]
+    return (candidatos or list(usuarios.values()))[0].nombre
+
+
+def siguiente_usuario(usuarios, actual):
+    nombres = list(usuarios)
+    if actual not in nombres:
+        return nombres[0]
+    return nombres[(nombres.index(actual) + 1) % len(nombres)]
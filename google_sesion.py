@@ -0,0 +1,49 @@
+import json
+from collections.abc import Mapping
+import streamlit as st
+from google.oauth2 import service_account
+from sheets_client import SheetsClient, SHEETS_API_URL, SCOPES, CONNECT_TIMEOUT, READ_TIMEOUT, nueva_sesion
+
+# ------------------ SESIÓN DE GOOGLE COMPARTIDA ------------------
+# Estudio (SheetsClient) y Hábitos (gspread) usan las mismas credenciales de
+# st.secrets["service_account"]: un solo objeto de credenciales (un token) y
+# una sola AuthorizedSession con su pool keep-alive por proceso. El refresh del
+# token y el handshake TLS se pagan una vez, la primera página que llega.
+
+# gspread.open() busca la planilla de hábitos por nombre en Drive
+SCOPES_DRIVE = ["https://www.googleapis.com/auth/drive"]
+
+
+def info_service_account(valor):
+    """El JSON de la service account como dict, venga como texto o como tabla TOML."""
+    if isinstance(valor, str):
+        return json.loads(valor)
+    if isinstance(valor, Mapping):
+        return dict(valor)
+    raise ValueError("st.secrets['service_account'] no es un JSON ni una tabla")
+
+
+@st.cache_resource
+def get_credenciales():
+    return service_account.Credentials.from_service_account_info(
+        info_service_account(st.secrets["service_account"]), scopes=SCOPES + SCOPES_DRIVE)
+
+
+@st.cache_resource
+def get_sesion_google():
+    return nueva_sesion(get_credenciales())
+
+
+@st.cache_resource
+def get_sheets_client():
+    return SheetsClient(get_credenciales(), base_url=st.secrets.get("sheets_api_url", SHEETS_API_URL),
+                        session=get_sesion_google())
+
+
+@st.cache_resource
+def get_gspread_client():
+    # Import acá: quien solo usa Estudio no carga gspread
+    import gspread
+    cliente = gspread.Client(auth=get_credenciales(), session=get_sesion_google())
+    cliente.set_timeout((CONNECT_TIMEOUT, READ_TIMEOUT))
+    return cliente
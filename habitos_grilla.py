@@ -0,0 +1,217 @@
+import threading
+from sheet_layout import indice_a_col
+
+# ------------------ ESTADO DIARIO DE LA GRILLA DE HÁBITOS ------------------
+# La hoja de hábitos tiene los nombres en la fila 1 y las fechas 'DD/MM' en la
+# columna A; una celda no vacía en (día, hábito) es un hábito hecho. Lo del día
+# (encabezados + fila de hoy) se trae una vez y queda en memoria del proceso;
+# las escrituras de la app lo actualizan en el lugar (y lo invalidan si fallan).
+
+
+def texto_fecha(fecha):
+    """Cómo está escrita la fecha en la columna A: 'DD/MM'."""
+    return f"{fecha.day:02d}/{fecha.month:02d}"
+
+
+# ------------------ ÍNDICE FECHA -> FILA ------------------
+# Una fila por día, seguidas: la fila de una fecha es aritmética desde un ancla
+# (fecha, fila), igual que get_day_config en estudio. El ancla viene de la
+# config o se calibra una sola vez por proceso leyendo la columna A. Cada
+# lectura del día trae la celda A de la fila calculada, así que si la hoja se
+# reorganiza se detecta y se recalibra.
+
+class IndiceFechas:
+    def __init__(self, fecha_base=None, fila_base=None):
+        self.lock = threading.Lock()
+        self.ancla = (fecha_base, int(fila_base)) if fecha_base is not None and fila_base is not None else None
+        self.calibraciones = 0
+
+    def fila(self, fecha):
+        """Fila (1-based) de `fecha`, o None si todavía no hay ancla."""
+        with self.lock:
+            if self.ancla is None:
+                return None
+            fecha_base, fila_base = self.ancla
+        fila = fila_base + (fecha - fecha_base).days
+        return fila if fila > 1 else None
+
+    def calibrar(self, columna_a, fecha):
+        """Ancla a partir de la columna A completa. Devuelve la fila de `fecha` o None.
+
+        'DD/MM' se repite cada año: vale la última aparición, la del año en curso.
+        """
+        texto = texto_fecha(fecha)
+        filas = [i for i, v in enumerate(columna_a, start=1) if str(v).strip() == texto]
+        with self.lock:
+            self.calibraciones += 1
+            if not filas:
+                return None
+            self.ancla = (fecha, filas[-1])
+        return filas[-1]
+
+
+class DiaHabitos:
+    """Encabezados y fila de un día (`fecha` es un date), con índice local nombre -> columna (1-based)."""
+
+    def __init__(self, fecha, fila, encabezados, valores):
+        self.fecha = fecha
+        self.fila = fila
+        self.encabezados = [str(h) for h in encabezados]
+        self.columnas = {}
+        for i, nombre in enumerate(self.encabezados, start=1):
+            if nombre.strip():
+                # Igual que headers.index(): si un nombre se repite, vale la primera columna
+                self.columnas.setdefault(nombre, i)
+        self.hechos = {
+            nombre for nombre, col in self.columnas.items()
+            if col <= len(valores) and str(valores[col - 1]).strip()
+        }
+
+    def columna_para(self, nombre, limite):
+        """(columna, es_nueva) donde se marca `nombre`.
+
+        Un hábito sin encabezado ocupa el primer hueco antes de la columna `limite`
+        (si no hay, la columna `limite` misma); sin `limite` en la hoja, va al final.
+        """
+        if nombre in self.columnas:
+            return self.columnas[nombre], False
+        enc = self.encabezados
+        if limite in self.columnas:
+            frontera = self.columnas[limite] - 1
+            for col in range(1, frontera + 1):
+                if col > len(enc) or not enc[col - 1].strip():
+                    return col, True
+            return frontera + 1, True
+        return len(enc) + 1, True
+
+    def marcar(self, nombre, col, es_nueva):
+        """Refleja en memoria una escritura de la app (llamar con el lock del CacheDias)."""
+        if es_nueva:
+            self.encabezados += [""] * (col - len(self.encabezados))
+            self.encabezados[col - 1] = nombre
+            self.columnas[nombre] = col
+        self.hechos.add(nombre)
+
+    def pendientes(self, nombres):
+        """Hábitos sin marcar hoy. Si el día no está en la hoja, no hay nada para marcar."""
+        if self.fila is None:
+            return []
+        return [n for n in nombres if n not in self.hechos]
+
+
+class CacheDias:
+    """DiaHabitos por fecha (date), compartido por todas las sesiones del proceso."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.dias = {}
+        self.generacion = 0
+
+    def obtener(self, fecha, cargar):
+        """(DiaHabitos, hit). `cargar()` solo corre si el día no está en memoria."""
+        with self.lock:
+            dia = self.dias.get(fecha)
+            generacion = self.generacion
+        if dia is not None:
+            return dia, True
+        dia = cargar()
+        with self.lock:
+            # Si alguien escribió mientras leíamos, lo leído puede ser viejo: no se guarda.
+            # Un día que todavía no está en la hoja tampoco: la fila se puede agregar en
+            # cualquier momento y tiene que aparecer en el próximo rerun.
+            if self.generacion == generacion and dia.fila is not None:
+                # Un solo día en memoria: los anteriores ya no se muestran
+                self.dias = {fecha: dia}
+        return dia, False
+
+    def invalidar(self, fecha=None):
+        with self.lock:
+            self.generacion += 1
+            if fecha is None:
+                self.dias = {}
+            else:
+                self.dias.pop(fecha, None)
+
+
+# ------------------ ESCRITURA EN SEGUNDO PLANO ------------------
+# El click marca el hábito en memoria (optimista) y encola la escritura; un hilo
+# por proceso manda todo lo encolado en un solo batchUpdate. Si falla, se avisa
+# con `al_fallar` (que invalida la memoria, así el hábito reaparece) y la sesión
+# que lo marcó encuentra el error en `tomar_fallas`.
+
+VALOR_HECHO = 1
+
+
+class EscritorHabitos:
+    def __init__(self, enviar, al_fallar=None):
+        """`enviar(data)` recibe la lista de {'range', 'values'} de un values:batchUpdate."""
+        self.enviar = enviar
+        self.al_fallar = al_fallar
+        self.cond = threading.Condition()
+        self.cola = []
+        self.en_vuelo = []
+        self.fallas = {}
+        self._hilo = None
+
+    def encolar(self, sesion, nombre, fila, col, es_nueva):
+        with self.cond:
+            self.cola.append((sesion, nombre, fila, col, es_nueva))
+            self.cond.notify_all()
+
+    def nombres_sin_confirmar(self):
+        """Hábitos encolados o enviándose: para la UI ya están hechos aunque la hoja no lo diga."""
+        with self.cond:
+            return {item[1] for item in self.cola + self.en_vuelo}
+
+    def en_curso(self, sesion):
+        with self.cond:
+            return sum(1 for item in self.cola + self.en_vuelo if item[0] == sesion)
+
+    def tomar_fallas(self, sesion):
+        """[(nombres, error)] de escrituras de `sesion` que fallaron desde la última consulta."""
+        with self.cond:
+            return self.fallas.pop(sesion, [])
+
+    def hay_fallas(self, sesion):
+        with self.cond:
+            return sesion in self.fallas
+
+    @staticmethod
+    def _data(items):
+        data = []
+        for _, nombre, fila, col, es_nueva in items:
+            letra = indice_a_col(col)
+            if es_nueva:
+                data.append({"range": f"{letra}1", "values": [[nombre]]})
+            data.append({"range": f"{letra}{fila}", "values": [[VALOR_HECHO]]})
+        return data
+
+    def _loop(self):
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.cola)
+                # Todo lo que se juntó mientras se mandaba lo anterior va en un solo pedido
+                self.en_vuelo, self.cola = self.cola, []
+                items = list(self.en_vuelo)
+            error = None
+            try:
+                self.enviar(self._data(items))
+            except Exception as e:
+                error = str(e)
+                # Primero se deshace lo optimista, después se publica la falla
+                if self.al_fallar is not None:
+                    self.al_fallar()
+            with self.cond:
+                self.en_vuelo = []
+                if error is not None:
+                    por_sesion = {}
+                    for sesion, nombre, *_ in items:
+                        por_sesion.setdefault(sesion, []).append(nombre)
+                    for sesion, nombres in por_sesion.items():
+                        self.fallas.setdefault(sesion, []).append((nombres, error))
+
+    def iniciar(self):
+        if self._hilo is None:
+            self._hilo = threading.Thread(target=self._loop, name="escritor-habitos", daemon=True)
+            self._hilo.start()
+        return self
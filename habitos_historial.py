@@ -0,0 +1,133 @@
+import threading
+from datetime import timedelta
+import numpy as np
+
+# ------------------ HISTORIAL DE HÁBITOS ------------------
+# La grilla entera (días x columnas de la hoja) se baja una vez y queda como
+# matriz booleana en memoria; después solo se agregan las filas de los días que
+# se cerraron desde la última vez. La fila de hoy sale del estado diario, que
+# ya refleja lo que marca la app. Rachas, tasas semanales por grupo y multas son
+# funciones puras de NumPy sobre esa matriz.
+
+MULTA_POR_HABITO = 3750
+GRUPOS = {1: "Mañana", 2: "Tarde", 3: "Noche"}
+
+
+def matriz_hechos(filas, ancho):
+    """Filas de la hoja (texto) -> matriz bool (filas, ancho): celda no vacía = hecho."""
+    celdas = np.full((len(filas), ancho), "", dtype=object)
+    for i, fila in enumerate(filas):
+        fila = fila[:ancho]
+        celdas[i, :len(fila)] = fila
+    return np.char.str_len(np.char.strip(celdas.astype(str))) > 0
+
+
+class CacheHistorial:
+    """Matriz bool de los días cerrados (filas 2..`hasta_fila` de la hoja), compartida por el proceso."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.bruto = np.zeros((0, 0), dtype=bool)
+        self.hasta_fila = 1
+
+    def agregar(self, bruto_nuevo, desde_fila, hasta_fila):
+        """Suma al final las filas `desde_fila`+1..`hasta_fila`, ensanchando con False si la hoja ganó columnas.
+
+        Si otra sesión agregó algo mientras se leía (la matriz ya no termina en
+        `desde_fila`), lo leído se descarta: así no se duplican días.
+        """
+        with self.lock:
+            if self.hasta_fila != desde_fila:
+                return False
+            ancho = max(self.bruto.shape[1], bruto_nuevo.shape[1])
+            viejo = np.pad(self.bruto, ((0, 0), (0, ancho - self.bruto.shape[1])))
+            nuevo = np.pad(bruto_nuevo, ((0, 0), (0, ancho - bruto_nuevo.shape[1])))
+            self.bruto = np.vstack([viejo, nuevo])
+            self.hasta_fila = hasta_fila
+            return True
+
+    def copia(self):
+        with self.lock:
+            return self.bruto, self.hasta_fila
+
+
+class HistorialHabitos:
+    """`hechos` y `activo` tienen forma (días, hábitos); el último día es hoy.
+
+    Para las tasas, un hábito cuenta (está activo) desde el primer día en que se
+    marcó. Las multas no usan `activo`: siguen la regla del cartel del día.
+    """
+    __slots__ = ("desde", "habitos", "grupos", "hechos", "activo")
+
+    def __init__(self, desde, habitos, grupos, hechos):
+        self.desde = desde
+        self.habitos = tuple(habitos)
+        self.grupos = np.asarray(grupos)
+        self.hechos = hechos
+        dias = np.arange(hechos.shape[0])[:, None]
+        self.activo = (dias >= hechos.argmax(axis=0)) & hechos.any(axis=0)
+
+    @property
+    def dias(self):
+        return self.hechos.shape[0]
+
+    @property
+    def fechas(self):
+        return [self.desde + timedelta(days=i) for i in range(self.dias)]
+
+
+def armar_historial(bruto, desde, columnas, hechos_hoy, habitos):
+    """HistorialHabitos desde la matriz de días cerrados (columnas de la hoja) más el día de hoy.
+
+    `columnas` es {nombre: columna 1-based}; `habitos` es [(nombre, grupo)] en el orden de la config.
+    """
+    hechos = np.zeros((bruto.shape[0] + 1, len(habitos)), dtype=bool)
+    for j, (nombre, _) in enumerate(habitos):
+        col = columnas.get(nombre)
+        if col is not None and col <= bruto.shape[1]:
+            hechos[:-1, j] = bruto[:, col - 1]
+        hechos[-1, j] = nombre in hechos_hoy
+    return HistorialHabitos(desde, [n for n, _ in habitos], [g for _, g in habitos], hechos)
+
+
+def _racha_final(hechos):
+    """Largo de la racha de True que termina en el último día, por columna."""
+    if hechos.shape[0] == 0:
+        return np.zeros(hechos.shape[1], dtype=int)
+    invertido = hechos[::-1]
+    return np.where(invertido.all(axis=0), hechos.shape[0], (~invertido).argmax(axis=0))
+
+
+def rachas(hechos):
+    """(actual, mejor) por hábito. Hoy sin marcar todavía no corta la racha de ayer."""
+    actual = np.where(hechos[-1], _racha_final(hechos), _racha_final(hechos[:-1]))
+    # Inicios y fines de cada tramo de True, columna por columna
+    borde = np.zeros((hechos.shape[1], 1), dtype=np.int8)
+    cambios = np.diff(np.hstack([borde, hechos.T.astype(np.int8), borde]), axis=1)
+    inicios, fines = np.argwhere(cambios == 1), np.argwhere(cambios == -1)
+    mejor = np.zeros(hechos.shape[1], dtype=int)
+    np.maximum.at(mejor, inicios[:, 0], fines[:, 1] - inicios[:, 1])
+    return actual, mejor
+
+
+def tasas_semanales(historial, semanas=8):
+    """(lunes de cada semana, tasas (semanas, grupos)) de las últimas `semanas`; NaN sin hábitos activos."""
+    offset = historial.desde.weekday()
+    semana = (np.arange(historial.dias) + offset) // 7
+    n = semana[-1] + 1
+    tasas = np.full((n, len(GRUPOS)), np.nan)
+    for k, grupo in enumerate(GRUPOS):
+        cols = historial.grupos == grupo
+        hechos = (historial.hechos[:, cols] & historial.activo[:, cols]).sum(axis=1)
+        posibles = historial.activo[:, cols].sum(axis=1)
+        hechos_sem = np.bincount(semana, weights=hechos, minlength=n)
+        posibles_sem = np.bincount(semana, weights=posibles, minlength=n)
+        np.divide(hechos_sem, posibles_sem, out=tasas[:, k], where=posibles_sem > 0)
+    lunes = historial.desde - timedelta(days=offset)
+    desde = max(0, n - semanas)
+    return [lunes + timedelta(weeks=i) for i in range(desde, n)], tasas[desde:]
+
+
+def multas(historial):
+    """Multa de cada día, con la misma regla que el cartel de hoy: hábitos configurados sin hacer * MULTA_POR_HABITO."""
+    return (~historial.hechos).sum(axis=1) * MULTA_POR_HABITO
@@ -0,0 +1,50 @@
+import time
+import importlib
+import threading
+import perfilado
+
+# ------------------ REGISTRO DE PÁGINAS (IMPORT PEREZOSO) ------------------
+# Cada página se importa recién la primera vez que alguien navega a ella: quien
+# solo usa Estudio nunca carga gspread, feedparser, bs4 ni deep_translator. El
+# tiempo de cada import queda registrado (y en la traza del rerun que lo pagó).
+
+# nombre -> (módulo, función de entrada)
+PAGINAS = {
+    "estudio":    ("app_estudio", "main"),
+    "habitos":    ("app_habitos", "run"),
+    "biblioteca": ("app_biblioteca", "main"),
+    "noticias":   ("app_noticias", "main"),
+}
+
+_lock = threading.Lock()
+_tiempos_import = {}
+
+
+def cargar(nombre):
+    """Función de entrada de la página `nombre`, importando su módulo si todavía no se usó."""
+    modulo, entrada = PAGINAS[nombre]
+    with _lock:
+        if modulo not in _tiempos_import:
+            t0 = time.perf_counter()
+            with perfilado.fase(f"import {modulo}"):
+                importlib.import_module(modulo)
+            _tiempos_import[modulo] = round((time.perf_counter() - t0) * 1000, 2)
+    return getattr(importlib.import_module(modulo), entrada)
+
+
+def tiempos_import():
+    """{módulo: ms} de las páginas importadas en este proceso."""
+    with _lock:
+        return dict(_tiempos_import)
+
+
+if __name__ == "__main__":
+    # Costo de import en frío de cada página, cada una en un proceso nuevo
+    import sys
+    import subprocess
+    for nombre, (modulo, _) in PAGINAS.items():
+        codigo = (f"import time; t0 = time.perf_counter(); import {modulo}; "
+                  f"print(round((time.perf_counter() - t0) * 1000, 1))")
+        r = subprocess.run([sys.executable, "-c", codigo], capture_output=True, text=True)
+        ms = r.stdout.strip().splitlines()[-1] if r.returncode == 0 and r.stdout.strip() else "error"
+        print(f"{nombre:<12}{modulo:<16}{ms:>10} ms")
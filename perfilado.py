@@ -0,0 +1,178 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+# ------------------ PERFILADO POR RERUN ------------------
+# Cada rerun arma una traza con el tiempo de cada fase de la página, cada
+# llamada externa (Sheets, gspread, feeds...) y los aciertos/fallos de cache.
+# La última traza se muestra en un panel del sidebar (solo admin) y todas se
+# agregan a un archivo JSONL para análisis offline.
+
+TRAZA_PATH_DEFAULT = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".trazas_rerun.jsonl")
+
+_local = threading.local()
+_archivo_lock = threading.Lock()
+
+
+class Traza:
+    def __init__(self, pagina=None):
+        self.pagina = pagina
+        self.inicio = time.time()
+        self._t0 = time.perf_counter()
+        self._marca = self._t0
+        self.fases = []
+        self.llamadas = []
+        self.cache = {}
+        self.misses = set()
+
+    def como_dict(self):
+        return {
+            "pagina": self.pagina,
+            "inicio": self.inicio,
+            "total_ms": round((time.perf_counter() - self._t0) * 1000, 2),
+            "fases": self.fases,
+            "llamadas": self.llamadas,
+            "cache": self.cache,
+        }
+
+
+def _actual():
+    """Traza del hilo actual. Los callbacks corren antes que la página, así que se crea sola."""
+    traza = getattr(_local, "traza", None)
+    if traza is None:
+        traza = Traza()
+        # Los hilos de fondo (journal, poller...) no pertenecen a ningún rerun
+        if get_script_run_ctx() is not None:
+            _local.traza = traza
+    return traza
+
+
+def iniciar_traza(pagina):
+    traza = _actual()
+    if traza.pagina is not None:
+        # Quedó abierta de un rerun cortado con st.stop(): empezamos de cero
+        traza = _local.traza = Traza()
+    traza.pagina = pagina
+    traza._marca = time.perf_counter()
+
+
+@contextmanager
+def pagina(nombre):
+    iniciar_traza(nombre)
+    try:
+        yield
+    finally:
+        cerrar_traza()
+
+
+def cerrar_traza():
+    traza = getattr(_local, "traza", None)
+    _local.traza = None
+    if traza is None:
+        return None
+    datos = traza.como_dict()
+    st.session_state["_ultima_traza"] = datos
+    try:
+        path = st.secrets.get("trace_path", TRAZA_PATH_DEFAULT)
+    except Exception:
+        path = TRAZA_PATH_DEFAULT
+    try:
+        with _archivo_lock, open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(datos, ensure_ascii=False) + "\n")
+    except OSError:
+        pass
+    return datos
+
+
+@contextmanager
+def fase(nombre):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        traza = _actual()
+        traza.fases.append({"nombre": nombre, "ms": round((time.perf_counter() - t0) * 1000, 2)})
+        traza._marca = time.perf_counter()
+
+
+def marcar(nombre):
+    """Cierra la fase `nombre`: registra el tiempo transcurrido desde la marca anterior."""
+    traza = _actual()
+    ahora = time.perf_counter()
+    traza.fases.append({"nombre": nombre, "ms": round((ahora - traza._marca) * 1000, 2)})
+    traza._marca = ahora
+
+
+def registrar_llamada(nombre, segundos, ok=True, bytes_recibidos=0):
+    _actual().llamadas.append({
+        "nombre": nombre, "ms": round(segundos * 1000, 2), "ok": ok, "bytes": bytes_recibidos,
+    })
+
+
+@contextmanager
+def llamada_externa(nombre):
+    t0 = time.perf_counter()
+    ok = False
+    try:
+        yield
+        ok = True
+    finally:
+        registrar_llamada(nombre, time.perf_counter() - t0, ok)
+
+
+def contar_cache(nombre, hit):
+    c = _actual().cache.setdefault(nombre, {"hit": 0, "miss": 0})
+    c["hit" if hit else "miss"] += 1
+
+
+def cache_miss(nombre):
+    """Llamar dentro del cuerpo de una función cacheada: solo se ejecuta en un miss."""
+    _actual().misses.add(nombre)
+
+
+def con_cache(nombre, fn, *args, **kwargs):
+    """Llama a una función st.cache_data que usa cache_miss() y registra si fue hit o miss."""
+    misses = _actual().misses
+    misses.discard(nombre)
+    resultado = fn(*args, **kwargs)
+    contar_cache(nombre, hit=nombre not in misses)
+    misses.discard(nombre)
+    return resultado
+
+
+def panel_admin():
+    """Desglose del rerun anterior en el sidebar."""
+    datos = st.session_state.get("_ultima_traza")
+    with st.sidebar.expander("⏱️ Perfilado del último rerun"):
+        if not datos:
+            st.caption("Todavía no hay trazas.")
+            return
+        st.markdown(f"**{datos['pagina'] or '?'}** — {datos['total_ms']:.0f} ms")
+        if datos["fases"]:
+            st.markdown("**Fases**")
+            for f in datos["fases"]:
+                st.text(f"{f['nombre']:<22}{f['ms']:>9.1f} ms")
+        if datos["llamadas"]:
+            st.markdown("**Llamadas externas**")
+            por_nombre = {}
+            for ll in datos["llamadas"]:
+                agg = por_nombre.setdefault(ll["nombre"], [0, 0.0, 0])
+                agg[0] += 1
+                agg[1] += ll["ms"]
+                agg[2] += ll["bytes"]
+            for nombre, (n, ms, b) in por_nombre.items():
+                st.text(f"{nombre:<22}{n:>3}x {ms:>8.1f} ms {b / 1024:>7.1f} KB")
+        if datos["cache"]:
+            st.markdown("**Cache**")
+            for nombre, c in datos["cache"].items():
+                st.text(f"{nombre:<22} hit {c['hit']:>3}  miss {c['miss']:>3}")
+        import paginas
+        imports = paginas.tiempos_import()
+        if imports:
+            st.markdown("**Import de páginas (una vez por proceso)**")
+            for modulo, ms in imports.items():
+                st.text(f"{modulo:<22}{ms:>9.1f} ms")
@@ -0,0 +1,132 @@
+import re
+from types import MappingProxyType
+
+# ------------------ NOTACIÓN A1 ------------------
+# Parser/formatter mínimo para celdas tipo 'Hoja'!B12, rectángulos 'Hoja'!B5:D40
+# y rangos abiertos hacia abajo 'Hoja'!A2:H.
+
+_A1_RE = re.compile(r"^(?:'((?:[^']|'')+)'|([^'!]+))!([A-Za-z]+)(\d+)(?::([A-Za-z]+)(\d+)?)?$")
+
+
+def col_a_indice(col):
+    """'A' -> 1, 'Z' -> 26, 'AA' -> 27."""
+    n = 0
+    for ch in col.upper():
+        n = n * 26 + (ord(ch) - 64)
+    return n
+
+
+def indice_a_col(n):
+    letras = ""
+    while n > 0:
+        n, resto = divmod(n - 1, 26)
+        letras = chr(65 + resto) + letras
+    return letras
+
+
+class _Inmutable:
+    __slots__ = ()
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} es inmutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} es inmutable")
+
+    def _set(self, **campos):
+        for k, v in campos.items():
+            object.__setattr__(self, k, v)
+
+
+def format_a1(hoja, col, fila, col_fin=None, fila_fin=None):
+    hoja_esc = hoja.replace("'", "''")
+    rango = f"'{hoja_esc}'!{col}{fila}"
+    if col_fin is not None:
+        rango += f":{col_fin}{fila_fin}"
+    return rango
+
+
+def parse_a1(rango):
+    """Devuelve (hoja, col, fila, col_fin, fila_fin); col_fin/fila_fin son None para una celda.
+
+    En un rango abierto ('Hoja'!A2:H) fila_fin es None y col_fin no.
+    """
+    m = _A1_RE.match(rango.strip())
+    if not m:
+        raise ValueError(f"Rango A1 inválido: {rango}")
+    hoja = m.group(1).replace("''", "'") if m.group(1) is not None else m.group(2)
+    fila_fin = int(m.group(6)) if m.group(6) else None
+    col_fin = m.group(5).upper() if m.group(5) else None
+    return hoja, m.group(3).upper(), int(m.group(4)), col_fin, fila_fin
+
+
+def agrupar_celdas(rangos):
+    """Junta celdas sueltas en pocos rectángulos para un batchGet.
+
+    Primero por (hoja, fila): todo lo de una fila va en un rango; lo que queda
+    solo se junta por (hoja, columna). Devuelve [(rango, [(celda, fila_rel, col_rel), ...])].
+    """
+    pos = {}
+    for r in dict.fromkeys(rangos):
+        hoja, col, fila, col_fin, _ = parse_a1(r)
+        if col_fin is not None:
+            raise ValueError(f"Se esperaba una sola celda: {r}")
+        pos[r] = (hoja, col_a_indice(col), fila)
+
+    por_fila = {}
+    for r, (hoja, c, f) in pos.items():
+        por_fila.setdefault((hoja, f), []).append(r)
+
+    grupos, por_col = [], {}
+    for (hoja, f), celdas in por_fila.items():
+        if len(celdas) == 1:
+            por_col.setdefault((hoja, pos[celdas[0]][1]), []).append(celdas[0])
+            continue
+        cols = [pos[r][1] for r in celdas]
+        c0 = min(cols)
+        rango = format_a1(hoja, indice_a_col(c0), f, indice_a_col(max(cols)), f)
+        grupos.append((rango, [(r, 0, pos[r][1] - c0) for r in celdas]))
+
+    for (hoja, c), celdas in por_col.items():
+        filas = [pos[r][2] for r in celdas]
+        f0, f1 = min(filas), max(filas)
+        col = indice_a_col(c)
+        rango = format_a1(hoja, col, f0) if f0 == f1 else format_a1(hoja, col, f0, col, f1)
+        grupos.append((rango, [(r, pos[r][2] - f0, 0) for r in celdas]))
+    return grupos
+
+
+def desagrupar(grupos, value_ranges, default=""):
+    """Inverso de agrupar_celdas sobre los valueRanges de la respuesta: {celda: valor}."""
+    valores = {}
+    for (_, celdas), vr in zip(grupos, value_ranges):
+        filas = vr.get("values", [])
+        for r, i, j in celdas:
+            valores[r] = filas[i][j] if i < len(filas) and j < len(filas[i]) else default
+    return valores
+
+
+# ------------------ LAYOUT DEL DÍA ------------------
+
+class MateriaLayout(_Inmutable):
+    __slots__ = ("nombre", "time", "est", "excluir")
+
+    def __init__(self, nombre, time, est, excluir=False):
+        self._set(nombre=nombre, time=time, est=est, excluir=excluir)
+
+
+class DayLayout(_Inmutable):
+    """Rangos A1 de un día. `users[usuario][materia]` es un MateriaLayout."""
+    __slots__ = ("fecha", "time_row", "users", "week", "rate", "obj", "check", "pozo")
+
+    def __init__(self, fecha, time_row, users, week, rate, obj, check, pozo):
+        self._set(
+            fecha=fecha, time_row=time_row,
+            users=MappingProxyType({u: MappingProxyType(dict(ms)) for u, ms in users.items()}),
+            week=week,
+            rate=MappingProxyType(dict(rate)), obj=MappingProxyType(dict(obj)),
+            check=MappingProxyType(dict(check)), pozo=MappingProxyType(dict(pozo)),
+        )
+
+    def __repr__(self):
+        return f"DayLayout({self.fecha.isoformat()})"
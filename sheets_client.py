@@ -0,0 +1,142 @@
+import time
+import random
+from urllib.parse import quote
+import threading
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from google.auth.transport.requests import AuthorizedSession
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError, Timeout
+import perfilado
+
+# ------------------ CLIENTE HTTP DE GOOGLE SHEETS ------------------
+# Una sola AuthorizedSession con pool de conexiones keep-alive, reintentos con
+# backoff exponencial en 429/5xx (respetando Retry-After), timeouts de conexión
+# y lectura separados, y contadores de latencia y bytes por operación.
+
+SHEETS_API_URL = "https://sheets.googleapis.com/v4/spreadsheets"
+SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
+
+POOL_CONNECTIONS = 4
+POOL_MAXSIZE = 16
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 20
+MAX_INTENTOS = 5
+BACKOFF_BASE = 0.5
+BACKOFF_MAXIMO = 16.0
+STATUS_REINTENTABLES = {429, 500, 502, 503, 504}
+
+
+class Metricas:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.por_operacion = {}
+
+    def registrar(self, operacion, segundos, enviados, recibidos, ok, reintento):
+        with self.lock:
+            m = self.por_operacion.setdefault(operacion, {
+                "llamadas": 0, "errores": 0, "reintentos": 0,
+                "segundos": 0.0, "max_segundos": 0.0,
+                "bytes_enviados": 0, "bytes_recibidos": 0,
+            })
+            m["llamadas"] += 1
+            m["errores"] += 0 if ok else 1
+            m["reintentos"] += 1 if reintento else 0
+            m["segundos"] += segundos
+            m["max_segundos"] = max(m["max_segundos"], segundos)
+            m["bytes_enviados"] += enviados
+            m["bytes_recibidos"] += recibidos
+
+    def resumen(self):
+        with self.lock:
+            return {op: dict(m) for op, m in self.por_operacion.items()}
+
+    def reset(self):
+        with self.lock:
+            self.por_operacion = {}
+
+
+def _segundos_retry_after(resp):
+    valor = resp.headers.get("Retry-After") if resp is not None else None
+    if not valor:
+        return None
+    try:
+        return max(0.0, float(valor))
+    except ValueError:
+        pass
+    try:
+        fecha = parsedate_to_datetime(valor)
+        return max(0.0, (fecha - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def nueva_sesion(credentials):
+    """AuthorizedSession con el pool keep-alive de este módulo (se puede compartir entre clientes)."""
+    session = AuthorizedSession(credentials)
+    adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class SheetsClient:
+    def __init__(self, credentials, base_url=SHEETS_API_URL, session=None):
+        """Sin `session` crea una propia; con `session`, la usa tal cual (pool y token compartidos)."""
+        self.base_url = base_url.rstrip("/")
+        self.session = session if session is not None else nueva_sesion(credentials)
+        self.timeout = (CONNECT_TIMEOUT, READ_TIMEOUT)
+        self.metricas = Metricas()
+
+    def _espera(self, intento, resp):
+        retry_after = _segundos_retry_after(resp)
+        if retry_after is not None:
+            return min(retry_after, BACKOFF_MAXIMO)
+        return min(BACKOFF_BASE * (2 ** intento), BACKOFF_MAXIMO) * random.uniform(0.8, 1.2)
+
+    def request(self, operacion, method, url, **kwargs):
+        """Hace la llamada con reintentos. Lanza RequestException si se agotan."""
+        for intento in range(MAX_INTENTOS):
+            t0 = time.perf_counter()
+            resp = None
+            try:
+                resp = self.session.request(method, url, timeout=self.timeout, **kwargs)
+            except (ConnectionError, Timeout):
+                if intento == MAX_INTENTOS - 1:
+                    self.metricas.registrar(operacion, time.perf_counter() - t0, 0, 0, False, intento > 0)
+                    perfilado.registrar_llamada(f"sheets.{operacion}", time.perf_counter() - t0, False)
+                    raise
+            segundos = time.perf_counter() - t0
+
+            if resp is not None:
+                enviados = len(resp.request.body or b"") if resp.request is not None else 0
+                ok = resp.status_code < 400
+                self.metricas.registrar(operacion, segundos, enviados, len(resp.content), ok, intento > 0)
+                perfilado.registrar_llamada(f"sheets.{operacion}", segundos, ok, len(resp.content))
+                if resp.status_code not in STATUS_REINTENTABLES or intento == MAX_INTENTOS - 1:
+                    resp.raise_for_status()
+                    return resp
+            else:
+                self.metricas.registrar(operacion, segundos, 0, 0, False, intento > 0)
+                perfilado.registrar_llamada(f"sheets.{operacion}", segundos, False)
+
+            time.sleep(self._espera(intento, resp))
+
+    def batch_get(self, spreadsheet_id, ranges, value_render_option="FORMATTED_VALUE", date_time_render_option=None):
+        url = f"{self.base_url}/{spreadsheet_id}/values:batchGet"
+        params = [("ranges", r) for r in ranges]
+        params.append(("valueRenderOption", value_render_option))
+        if date_time_render_option and value_render_option != "FORMATTED_VALUE":
+            params.append(("dateTimeRenderOption", date_time_render_option))
+        return self.request("batchGet", "GET", url, params=params).json()
+
+    def append(self, spreadsheet_id, rango, filas, value_input_option="RAW"):
+        """values:append: agrega `filas` debajo de la última fila con datos de la tabla en `rango`."""
+        url = f"{self.base_url}/{spreadsheet_id}/values/{quote(rango, safe='')}:append"
+        params = {"valueInputOption": value_input_option, "insertDataOption": "INSERT_ROWS"}
+        return self.request("append", "POST", url, params=params, json={"values": filas}).json()
+
+    def batch_update(self, spreadsheet_id, data, value_input_option="USER_ENTERED"):
+        url = f"{self.base_url}/{spreadsheet_id}/values:batchUpdate"
+        body = {"valueInputOption": value_input_option, "data": data}
+        return self.request("batchUpdate", "POST", url, json=body).json()
@@ -0,0 +1,93 @@
+import re
+from datetime import datetime, timezone
+import numpy as np
+
+# ------------------ DECODIFICACIÓN COLUMNAR DE VALUERANGES ------------------
+# Con valueRenderOption=UNFORMATTED_VALUE y dateTimeRenderOption=SERIAL_NUMBER
+# la API devuelve números: las duraciones como fracción de día y las fechas como
+# número de serie (días desde 1899-12-30, en la zona horaria de la hoja). Las
+# celdas que escribimos nosotros (write-through, journal) siguen siendo texto
+# "HH:MM:SS" o ISO, así que cada decodificador acepta ambos. Se despacha por
+# tipo y por regex: nada de try/except en el camino caliente. Cualquier otra
+# cosa (booleanos de casillas, None) decodifica como celda vacía.
+
+UNFORMATTED = "UNFORMATTED_VALUE"
+SERIAL_NUMBER = "SERIAL_NUMBER"
+
+SEGUNDOS_POR_DIA = 86400
+_EPOCH_SERIAL = 25569  # 1970-01-01 en números de serie de Sheets
+
+_HMS_RE = re.compile(r"^\s*(\d+):(\d{1,2}):(\d{1,2})\s*$")
+_NUM_RE = re.compile(r"^\s*-?\d+(?:[.,]\d+)?\s*$")
+_ISO_RE = re.compile(r"^\s*\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?(?:Z|[+-]\d{2}:?\d{2})?\s*$")
+
+
+def _es_numero(v):
+    return type(v) in (int, float)
+
+
+def segundos(v):
+    """Duración en segundos: fracción de día (número) o texto 'HH:MM:SS'."""
+    if _es_numero(v):
+        return int(round(v * SEGUNDOS_POR_DIA))
+    if not isinstance(v, str) or not v:
+        return 0
+    m = _HMS_RE.match(v)
+    if m:
+        return int(m.group(1)) * 3600 + int(m.group(2)) * 60 + int(m.group(3))
+    if _NUM_RE.match(v):
+        f = float(v.replace(",", "."))
+        return int(f * SEGUNDOS_POR_DIA) if 0 <= f <= 1 else int(f)
+    return 0
+
+
+def numero(v):
+    if _es_numero(v):
+        return float(v)
+    if isinstance(v, str) and _NUM_RE.match(v):
+        return float(v.replace(",", "."))
+    return 0.0
+
+
+def epoch(v, tz):
+    """Segundos desde 1970 (float) o NaN si la celda no es una fecha."""
+    if _es_numero(v):
+        # El serial está en hora local de la hoja: lo pasamos a UTC con el offset de ese momento
+        local = (v - _EPOCH_SERIAL) * SEGUNDOS_POR_DIA
+        offset = datetime.fromtimestamp(local, timezone.utc).replace(tzinfo=tz).utcoffset()
+        return local - (offset.total_seconds() if offset else 0.0)
+    if isinstance(v, str) and _ISO_RE.match(v):
+        dt = datetime.fromisoformat(v.strip().replace("Z", "+00:00"))
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=tz)
+        return dt.timestamp()
+    return float("nan")
+
+
+def texto(v):
+    return "" if v is None else str(v)
+
+
+def columna_segundos(valores):
+    return np.fromiter((segundos(v) for v in valores), dtype=np.int64, count=len(valores))
+
+
+def columna_numeros(valores):
+    return np.fromiter((numero(v) for v in valores), dtype=np.float64, count=len(valores))
+
+
+def columna_epoch(valores, tz):
+    return np.fromiter((epoch(v, tz) for v in valores), dtype=np.float64, count=len(valores))
+
+
+def columnas(values, filas, ancho):
+    """Matriz de una valueRange -> lista de `ancho` columnas de `filas` celdas, rellenando con ''."""
+    cols = [[""] * filas for _ in range(ancho)]
+    for i, fila in enumerate(values[:filas]):
+        for j, v in enumerate(fila[:ancho]):
+            cols[j][i] = v
+    return cols
+
+
+def datetime_de_epoch(e, tz):
+    return None if e != e else datetime.fromtimestamp(e, tz)
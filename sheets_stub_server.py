@@ -0,0 +1,238 @@
+import re
+import json
+import time
+import argparse
+import threading
+from datetime import datetime
+from urllib.parse import urlparse, parse_qs, unquote
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from sheet_layout import parse_a1, col_a_indice, indice_a_col
+
+# ------------------ STAND-IN LOCAL DE LA API DE SHEETS ------------------
+# Implementa values:batchGet, values:batchUpdate y values:append sobre una grilla en memoria,
+# más un /token falso para que las credenciales de service account funcionen.
+# Sirve para medir app_estudio sin gastar cuota de Google.
+#
+#   python sheets_stub_server.py --port 8765 --latency 150
+
+_RUTA_VALUES = re.compile(r"^/v4/spreadsheets/([^/]+)/values:(batchGet|batchUpdate)$")
+_RUTA_APPEND = re.compile(r"^/v4/spreadsheets/([^/]+)/values/(.+):append$")
+_HMS_RE = re.compile(r"^(\d+):(\d{1,2}):(\d{1,2})$")
+_NUM_RE = re.compile(r"^-?\d+(?:\.\d+)?$")
+_FECHA_RE = re.compile(r"^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}$")
+
+
+def renderizar(valor, value_render_option):
+    """Imita UNFORMATTED_VALUE + SERIAL_NUMBER para lo que Sheets interpretaría con USER_ENTERED."""
+    if not isinstance(valor, str):
+        # Escrito RAW: ya tiene su tipo
+        return str(valor) if value_render_option == "FORMATTED_VALUE" else valor
+    if value_render_option == "FORMATTED_VALUE":
+        return valor
+    m = _HMS_RE.match(valor)
+    if m:
+        return (int(m.group(1)) * 3600 + int(m.group(2)) * 60 + int(m.group(3))) / 86400
+    if _NUM_RE.match(valor):
+        f = float(valor)
+        return int(f) if f.is_integer() else f
+    if _FECHA_RE.match(valor):
+        dt = datetime.strptime(valor, "%Y-%m-%d %H:%M:%S")
+        return (dt - datetime(1899, 12, 30)).total_seconds() / 86400
+    return valor
+
+
+class Grilla:
+    """Celdas por (hoja, col, fila). USER_ENTERED se guarda como texto; RAW, con su tipo."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.celdas = {}
+
+    def ultima_fila(self, hoja):
+        return max((f for h, _, f in self.celdas if h == hoja), default=0)
+
+    def leer(self, rango):
+        hoja, col, fila, col_fin, fila_fin = parse_a1(rango)
+        c0, c1 = col_a_indice(col), col_a_indice(col_fin or col)
+        with self.lock:
+            # Rango abierto ('Hoja'!A2:H): hasta la última fila con datos
+            f1 = fila_fin or (self.ultima_fila(hoja) if col_fin else fila)
+            filas = []
+            for f in range(fila, f1 + 1):
+                valores = [self.celdas.get((hoja, indice_a_col(c), f), "") for c in range(c0, c1 + 1)]
+                while valores and valores[-1] == "":
+                    valores.pop()
+                filas.append(valores)
+        # Igual que la API real: sin filas vacías al final
+        while filas and not filas[-1]:
+            filas.pop()
+        return filas
+
+    def escribir(self, rango, values, crudo=False):
+        hoja, col, fila, _, _ = parse_a1(rango)
+        c0 = col_a_indice(col)
+        with self.lock:
+            self._escribir(hoja, c0, fila, values, crudo)
+
+    def _escribir(self, hoja, c0, fila, values, crudo):
+        for i, fila_vals in enumerate(values):
+            for j, v in enumerate(fila_vals):
+                clave = (hoja, indice_a_col(c0 + j), fila + i)
+                if v == "" or v is None:
+                    self.celdas.pop(clave, None)
+                else:
+                    self.celdas[clave] = v if crudo else str(v)
+
+    def agregar(self, rango, values, crudo=False):
+        """values:append: las filas van debajo de la última fila con datos de la hoja."""
+        # 'Hoja'!A:H no tiene filas: nos quedamos con hoja y columna de la esquina
+        hoja, col, _, _, _ = parse_a1(re.sub(r"\d*$", "1", rango.split(":")[0]))
+        with self.lock:
+            fila = self.ultima_fila(hoja) + 1
+            self._escribir(hoja, col_a_indice(col), fila, values, crudo)
+        return fila
+
+    def set(self, rango, valor):
+        self.escribir(rango, [[valor]])
+
+    def get(self, rango):
+        filas = self.leer(rango)
+        return filas[0][0] if filas and filas[0] else ""
+
+
+class StubSheets:
+    def __init__(self, latency_ms=0, host="127.0.0.1", port=0):
+        self.grilla = Grilla()
+        self.latency = latency_ms / 1000.0
+        self.lock = threading.Lock()
+        self.llamadas = {}
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self._hilo = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def api_url(self):
+        return f"{self.url}/v4/spreadsheets"
+
+    @property
+    def token_uri(self):
+        return f"{self.url}/token"
+
+    def contar(self, operacion):
+        with self.lock:
+            self.llamadas[operacion] = self.llamadas.get(operacion, 0) + 1
+
+    def conteo(self):
+        with self.lock:
+            return dict(self.llamadas)
+
+    def reset_conteo(self):
+        with self.lock:
+            self.llamadas = {}
+
+    def iniciar(self):
+        self._hilo = threading.Thread(target=self.server.serve_forever, name="stub-sheets", daemon=True)
+        self._hilo.start()
+        return self
+
+    def detener(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _responder(self, status, payload):
+                cuerpo = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=UTF-8")
+                self.send_header("Content-Length", str(len(cuerpo)))
+                self.end_headers()
+                self.wfile.write(cuerpo)
+
+            def _leer_cuerpo(self):
+                largo = int(self.headers.get("Content-Length") or 0)
+                return self.rfile.read(largo) if largo else b""
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                m = _RUTA_VALUES.match(unquote(url.path))
+                if not m or m.group(2) != "batchGet":
+                    return self._responder(404, {"error": {"code": 404, "message": "Not found"}})
+                time.sleep(stub.latency)
+                stub.contar("batchGet")
+                query = parse_qs(url.query)
+                rangos = query.get("ranges", [])
+                render = query.get("valueRenderOption", ["FORMATTED_VALUE"])[0]
+                try:
+                    value_ranges = []
+                    for r in rangos:
+                        vr = {"range": r, "majorDimension": "ROWS"}
+                        filas = stub.grilla.leer(r)
+                        if filas:
+                            vr["values"] = [[renderizar(v, render) if v != "" else "" for v in fila] for fila in filas]
+                        value_ranges.append(vr)
+                except ValueError as e:
+                    return self._responder(400, {"error": {"code": 400, "message": str(e)}})
+                self._responder(200, {"spreadsheetId": m.group(1), "valueRanges": value_ranges})
+
+            def do_POST(self):
+                url = urlparse(self.path)
+                cuerpo = self._leer_cuerpo()
+                if url.path == "/token":
+                    stub.contar("token")
+                    return self._responder(200, {"access_token": "stub", "expires_in": 3600, "token_type": "Bearer"})
+                m = _RUTA_APPEND.match(unquote(url.path))
+                if m:
+                    time.sleep(stub.latency)
+                    stub.contar("append")
+                    crudo = parse_qs(url.query).get("valueInputOption", ["RAW"])[0] == "RAW"
+                    try:
+                        values = json.loads(cuerpo or b"{}").get("values", [])
+                        fila = stub.grilla.agregar(m.group(2), values, crudo)
+                    except (ValueError, KeyError) as e:
+                        return self._responder(400, {"error": {"code": 400, "message": str(e)}})
+                    return self._responder(200, {"spreadsheetId": m.group(1), "updates": {"updatedRows": len(values), "updatedRange": f"{m.group(2)}@{fila}"}})
+                m = _RUTA_VALUES.match(unquote(url.path))
+                if not m or m.group(2) != "batchUpdate":
+                    return self._responder(404, {"error": {"code": 404, "message": "Not found"}})
+                time.sleep(stub.latency)
+                stub.contar("batchUpdate")
+                try:
+                    data = json.loads(cuerpo or b"{}").get("data", [])
+                    for d in data:
+                        stub.grilla.escribir(d["range"], d.get("values", []))
+                except (ValueError, KeyError) as e:
+                    return self._responder(400, {"error": {"code": 400, "message": str(e)}})
+                self._responder(200, {"spreadsheetId": m.group(1), "totalUpdatedCells": sum(len(d.get("values", [])) for d in data)})
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stand-in local de la API de Google Sheets")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0, help="latencia inyectada por llamada, en ms")
+    args = parser.parse_args()
+    stub = StubSheets(args.latency, args.host, args.port)
+    print(f"Stub de Sheets en {stub.api_url} (token_uri {stub.token_uri})")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()